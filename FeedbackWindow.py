@@ -2,8 +2,61 @@ import tkinter as tk
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 from matplotlib.figure import Figure
 from PIL import Image, ImageTk
-from playsound import playsound
+import numpy as np
 import os
+import threading
+from collections import OrderedDict
+import feedback_audio
+
+
+class _ImageCache:
+    """
+    Decoded feedback images and their resampled copies, shared by all popups.
+    Only final (LANCZOS) sizes are kept, up to `max_scaled` of them.
+    """
+    def __init__(self, max_scaled=8):
+        self.max_scaled = max_scaled
+        self._originals = {}
+        self._scaled = OrderedDict()
+        self._lock = threading.Lock()
+
+    def original(self, path):
+        with self._lock:
+            img = self._originals.get(path)
+            if img is None:
+                with Image.open(path) as f:
+                    img = f.convert('RGB')  # decode once, no file handle kept
+                self._originals[path] = img
+            return img
+
+    def scaled(self, path, size, final=True):
+        """ `path` resized to `size`: LANCZOS (cached) if final, else a fast nearest-neighbour preview. """
+        if not final:
+            return self.original(path).resize(size, Image.NEAREST)
+        key = (path, size)
+        with self._lock:
+            if key in self._scaled:
+                self._scaled.move_to_end(key)
+                return self._scaled[key]
+        img = self.original(path).resize(size, Image.LANCZOS)
+        with self._lock:
+            self._scaled[key] = img
+            while len(self._scaled) > self.max_scaled:
+                self._scaled.popitem(last=False)
+        return img
+
+
+_image_cache = _ImageCache()
+FEEDBACK_IMAGES = {True: os.path.join('resource', 'correct.png'), False: os.path.join('resource', 'wrong.png')}
+FEEDBACK_SIZE = (500, 300)
+
+
+def preload_feedback_images():
+    """ Decode both images and scale them to the default popup size (e.g. on a startup thread). """
+    for path in FEEDBACK_IMAGES.values():
+        if os.path.exists(path):
+            _image_cache.scaled(path, FEEDBACK_SIZE)
+
 
 class FeedbackWindow:
     """
@@ -16,35 +69,54 @@ class FeedbackWindow:
         self.popup = tk.Toplevel(self.master)
         self.popup.title("Feedback")
         self.popup.attributes("-topmost", True)
-        self.popup.geometry("500x300+500+300")  # Offset but im not sure if it's generally a good one
+        self.popup.geometry("{}x{}+500+300".format(*FEEDBACK_SIZE))  # Offset but im not sure if it's generally a good one
         
-        # Background pic
-        correct_image = 'correct.png'
-        incorrect_image = 'wrong.png'
-        image_path = os.path.join('resource',correct_image if self.is_correct else incorrect_image)
-        self.original_img = Image.open(image_path)
+        # Background pic, from the process-wide cache
+        self.image_path = FEEDBACK_IMAGES[bool(self.is_correct)]
         self.bg_image_tk = None
+        self.bg_size = None
+        self._resize_job = None
         self.bg_label = tk.Label(self.popup)
         self.bg_label.place(x=0, y=0, relwidth=1, relheight=1)
         
         self.popup.bind("<Configure>", self.on_resize)
         
-        # Chicken Sound playback
-        if is_correct:
-            playsound(os.path.join('resource', 'correct.mp3'))
-        else:
-            playsound(os.path.join('resource', 'wrong.mp3'))
+        # Chicken Sound playback, asynchronous so the popup shows right away
+        feedback_audio.play('correct' if is_correct else 'wrong')
                
         # Use global grab so that we can block other windows, but sometimes it doesnt work
         self.popup.grab_set_global()
         self.popup.wait_window(self.popup)
 
+    RESIZE_DEBOUNCE_MS = 120
+
     def on_resize(self, event):
-        new_w = event.width
-        new_h = event.height
-        resized_img = self.original_img.resize((new_w, new_h), Image.LANCZOS)
-        self.bg_image_tk = ImageTk.PhotoImage(resized_img)
-        self.bg_label.config(image=self.bg_image_tk)
+        """
+        Resizes are debounced: while the window is being dragged a fast preview is
+        shown, and only the size it settles on is resampled with LANCZOS.
+        """
+        if event.widget is not self.popup:
+            return  # <Configure> of the label inside
+        size = (max(1, event.width), max(1, event.height))
+        if size == self.bg_size:
+            return
+        if self._resize_job is not None:
+            self.popup.after_cancel(self._resize_job)
+        if self.bg_size is None:
+            # First layout: the default size is usually pre-scaled already
+            self._show_background(size, final=True)
+            return
+        self._show_background(size, final=False)
+        self._resize_job = self.popup.after(self.RESIZE_DEBOUNCE_MS, self._show_background, size, True)
+
+    def _show_background(self, size, final):
+        self._resize_job = None
+        try:
+            self.bg_image_tk = ImageTk.PhotoImage(_image_cache.scaled(self.image_path, size, final=final))
+            self.bg_label.config(image=self.bg_image_tk)
+        except (tk.TclError, OSError):
+            return  # popup closed meanwhile, or image missing
+        self.bg_size = size
 
 
 class TrialResultWindow:
@@ -90,30 +162,79 @@ class TrialResultWindow:
         self.ax = self.fig.add_subplot(111)
         self.canvas = FigureCanvasTkAgg(self.fig, master=self.master)
         self.canvas.get_tk_widget().pack(side="top", fill="both", expand=True)
+        self.metrics_label = tk.Label(self.master, text="", fg="black", bg="white", font=("Arial", 12), justify="left")
+        self.metrics_label.pack(side="top", fill="x", padx=10, pady=(0, 10))
         
         self.ax.set_title("Trial-by-Trial Accuracy")
         self.ax.set_xlabel("Trial #")
         self.ax.set_ylabel("Accuracy")
-        self.ax.set_ylim(0, 1)
+        self.ax.set_xlim(1, 10)
+        self.ax.set_ylim(0, 1.05)
         self.ax.grid(True)
         self.fig.tight_layout()
-        self.line, = self.ax.plot([], [], marker='o', linestyle='-', color='b')
+        # Drawn by blitting only, over the cached axes background
+        self.line, = self.ax.plot([], [], marker='o', linestyle='-', color='b', animated=True)
+        self._x = np.empty(64)
+        self._y = np.empty(64)
+        self._n = 0
+        self._background = None
+        self.canvas.mpl_connect('draw_event', self._on_draw)
+        self.canvas.draw()
         
         self.plot_created = True # Flag to True
-    
-    def set_accuracies(self, full_list):
+
+    def _on_draw(self, event):
+        """ After every full draw (first show, resize, new x range): cache the background, add the line. """
+        self._background = self.canvas.copy_from_bbox(self.ax.bbox)
+        self.ax.draw_artist(self.line)
+
+    def _blit(self):
+        if self._background is None:
+            self.canvas.draw()
+            return
+        self.canvas.restore_region(self._background)
+        self.ax.draw_artist(self.line)
+        self.canvas.blit(self.ax.bbox)
+
+    def add_accuracy(self, accuracy):
+        """ Append one trial. Only the line is redrawn, unless the x range has to grow. """
         if not self.plot_created:
             self.create_plot()
+        if self._n == len(self._x):
+            self._x = np.resize(self._x, 2 * self._n)
+            self._y = np.resize(self._y, 2 * self._n)
+        self._x[self._n] = self._n + 1
+        self._y[self._n] = accuracy
+        self._n += 1
+        self.line.set_data(self._x[:self._n], self._y[:self._n])
+        if self._n + 1 > self.ax.get_xlim()[1]:
+            # Doubling the range keeps full redraws to a handful per session
+            self.ax.set_xlim(1, 2 * self._n)
+            self.canvas.draw()
+        else:
+            self._blit()
 
-        x_data = range(1, len(list(full_list)) + 1)
-        y_data = list(full_list)
-
-        self.line.set_xdata(x_data)
-        self.line.set_ydata(y_data)
-        self.ax.set_xlim(1, max(1, len(x_data)+1))
-        self.ax.set_ylim(0, 1.05)
+    def set_accuracies(self, full_list):
+        """ Replace the whole history (e.g. of a resumed session) with one full draw. """
+        if not self.plot_created:
+            self.create_plot()
+        y_data = np.asarray(list(full_list), dtype=float)
+        self._n = len(y_data)
+        self._x = np.arange(1, max(64, 2 * self._n) + 1, dtype=float)
+        self._y = np.resize(y_data, len(self._x))
+        self.line.set_data(self._x[:self._n], self._y[:self._n])
+        self.ax.set_xlim(1, max(10, 2 * self._n))
         self.canvas.draw()
 
+    def set_metrics(self, summaries):
+        """ Running accuracy and d' per channel type, e.g. from run_funcs.RunningMetrics.summaries(). """
+        if not self.plot_created:
+            self.create_plot()
+        self.metrics_label.config(text="\n".join(
+            f"{ch_type}: accuracy {m['accuracy']*100:.1f}%, d'={m['dprime']:.2f} ({m['trials']} trials)"
+            for ch_type, m in summaries.items()
+        ))
+
 import tkinter as tk
 
 class TrialEndWindow:
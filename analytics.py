@@ -0,0 +1,172 @@
+# analytics.py
+# Cohort-wide training metrics across all participants, sessions and channel types.
+# Reads the results store and every results_*.csv in config.res_dir (CSV files are
+# parsed in parallel; a session present in the store is taken from there), then
+# computes hit rate, false-alarm rate, accuracy, d' and criterion per group with
+# array operations (run_funcs.signal_detection_metrics).
+# e.g. python analytics.py --out data/analytics
+# Writes sessions.csv, participants.csv and cohort.csv (one row per group and
+# channel type, plus channel_type='all').
+import os
+import csv
+import glob
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import config
+from run_funcs import signal_detection_metrics
+from results_store import ResultsStore
+
+COUNT_FIELDS = ('Hits', 'FalseAlarms', 'Misses', 'CorrectRejections')
+LEVELS = {
+    "sessions": ("participant", "session", "mode", "condition"),
+    "participants": ("participant", "mode", "condition"),
+    "cohort": ("mode", "condition"),
+}
+KEY_FIELDS = ("participant", "session", "mode", "condition")
+
+
+def _parse_results_name(path):
+    """ (participant, session, mode, condition) from results_<p>_<s>_<mode>_<cond>.csv, or None. """
+    name = os.path.basename(path)[len("results_"):-len(".csv")]
+    parts = name.rsplit('_', 3)
+    return tuple(parts) if len(parts) == 4 else None
+
+
+def _read_results_csv(path):
+    """ (key, channel types, counts array (n_trials, 4)) of one results CSV. """
+    key = _parse_results_name(path)
+    ch_types, counts = [], []
+    with open(path, 'r', newline='') as f:
+        for row in csv.DictReader(f):
+            try:
+                counts.append([int(row[field]) for field in COUNT_FIELDS])
+            except (KeyError, ValueError):
+                continue
+            ch_types.append(row['ChannelType'])
+    return key, ch_types, np.array(counts, dtype=np.int64).reshape(-1, 4)
+
+
+def load_results(res_dir=config.res_dir, db_path=config.results_db, n_jobs=None):
+    """
+    All trial results as column arrays: the four key columns, 'channel_type'
+    and 'counts' (n_trials x [hits, false alarms, misses, correct rejections]).
+    """
+    columns = {field: [] for field in KEY_FIELDS + ("channel_type",)}
+    counts = []
+    in_store = set()
+
+    if os.path.exists(db_path):
+        store = ResultsStore(db_path)
+        try:
+            rows = store.conn.execute(
+                "SELECT participant, session, mode, condition, channel_type, "
+                "hits, false_alarms, misses, correct_rejections FROM results"
+            ).fetchall()
+        finally:
+            store.close()
+        for row in rows:
+            key = tuple(row[:4])
+            in_store.add(key)
+            for field, value in zip(KEY_FIELDS, key):
+                columns[field].append(value)
+            columns["channel_type"].append(row[4])
+        counts.append(np.array([tuple(row[5:]) for row in rows], dtype=np.int64).reshape(-1, 4))
+
+    paths = [
+        path for path in sorted(glob.glob(os.path.join(res_dir, "results_*.csv")))
+        if _parse_results_name(path) not in in_store
+    ]
+    if paths:
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            for key, ch_types, file_counts in executor.map(_read_results_csv, paths, chunksize=32):
+                if key is None:
+                    continue
+                for field, value in zip(KEY_FIELDS, key):
+                    columns[field].extend([value] * len(ch_types))
+                columns["channel_type"].extend(ch_types)
+                counts.append(file_counts)
+
+    results = {field: np.array(values, dtype=object) for field, values in columns.items()}
+    results["counts"] = np.concatenate(counts) if counts else np.zeros((0, 4), dtype=np.int64)
+    return results
+
+
+def summarize(results, group_fields):
+    """
+    Metrics per group of `group_fields` x channel type (channel_type 'all' pools
+    the types). Returns a list of row dicts.
+    """
+    n = len(results["counts"])
+    if n == 0:
+        return []
+    # Every trial counts once for its own channel type and once for 'all'
+    keys = [np.concatenate([results[field], results[field]]) for field in group_fields]
+    keys.append(np.concatenate([results["channel_type"], np.full(n, 'all', dtype=object)]))
+    counts = np.concatenate([results["counts"], results["counts"]])
+
+    joined = np.array(['\x1f'.join(map(str, values)) for values in zip(*keys)])
+    groups, first, inverse = np.unique(joined, return_index=True, return_inverse=True)
+    sums = np.zeros((len(groups), 4), dtype=np.int64)
+    np.add.at(sums, inverse, counts)
+    n_trials = np.bincount(inverse, minlength=len(groups))
+    metrics = signal_detection_metrics(*sums.T)
+
+    rows = []
+    for g in range(len(groups)):
+        row = {field: key[first[g]] for field, key in zip(group_fields + ("channel_type",), keys)}
+        row.update(
+            n_trials=int(n_trials[g]),
+            hits=int(sums[g, 0]),
+            false_alarms=int(sums[g, 1]),
+            misses=int(sums[g, 2]),
+            correct_rejections=int(sums[g, 3]),
+        )
+        row.update({name: round(float(values[g]), 6) for name, values in metrics.items()})
+        rows.append(row)
+    return rows
+
+
+def write_table(rows, path):
+    if not rows:
+        return
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+    os.replace(tmp_path, path)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Hit rate, false-alarm rate, accuracy, d' and criterion across all training results."
+    )
+    parser.add_argument("--res-dir", default=config.res_dir, help=f"Directory with results_*.csv (default={config.res_dir}).")
+    parser.add_argument("--db", default=config.results_db, help=f"Results store (default={config.results_db}).")
+    parser.add_argument("--out", default=os.path.join('data', 'analytics'), help="Output directory for the summary tables.")
+    parser.add_argument("--jobs", type=int, default=None, help="Processes reading CSV files (default: all cores).")
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    results = load_results(args.res_dir, args.db, n_jobs=args.jobs)
+    n_sessions = len(set(zip(*(results[field] for field in KEY_FIELDS))))
+    print(f"[LOAD] {len(results['counts'])} trials from {n_sessions} sessions in {time.perf_counter() - t0:.2f}s")
+
+    os.makedirs(args.out, exist_ok=True)
+    for level, group_fields in LEVELS.items():
+        rows = summarize(results, group_fields)
+        path = os.path.join(args.out, f"{level}.csv")
+        write_table(rows, path)
+        print(f"[WRITE] {path}: {len(rows)} rows")
+
+    for row in summarize(results, LEVELS["cohort"]):
+        print(f"{row['mode']:<5} {row['condition']:<5} {row['channel_type']:<5} n={row['n_trials']:<6} "
+              f"HR={row['hit_rate']:.3f} FAR={row['fa_rate']:.3f} Acc={row['accuracy']*100:.1f}% "
+              f"d'={row['dprime']:.3f} c={row['criterion']:.3f}")
+    print(f"[DONE] {time.perf_counter() - t0:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
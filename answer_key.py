@@ -0,0 +1,121 @@
+# answer_key.py
+# Compiled index of answer_standardized.json.
+# The nested subj -> ses -> run dicts are flattened once into
+# (subj, ses, run, ch_type) -> frozenset lookups, for bad channels and for ICA
+# components to remove. The compiled index is pickled next to the JSON
+# (<json>.idx.pkl) and kept in memory per process; both are rebuilt when the
+# JSON's mtime or size changes.
+import os
+import json
+import pickle
+
+INDEX_VERSION = 1
+_EMPTY = frozenset()
+_loaded = {}  # abs path -> AnswerKey, per process
+
+
+class AnswerKey:
+    """ O(1) answer lookup by (subj, ses, run, ch_type). """
+
+    def __init__(self, bad_channels, bad_components):
+        self._bad_channels = bad_channels
+        self._bad_components = bad_components
+        self.stamp = None  # (mtime_ns, size) of the JSON it was compiled from
+
+    def bad_channels(self, subj, ses, run, ch_type):
+        """ Bad channels of one recording for 'eeg', 'mag' or 'grad'. """
+        return self._bad_channels.get((subj, ses, run, ch_type), _EMPTY)
+
+    def bad_components(self, subj, ses, run, ch_type):
+        """ ICA components to remove for one recording and channel type. """
+        return self._bad_components.get((subj, ses, run, ch_type), _EMPTY)
+
+
+def _meg_channel_type(ch_name):
+    # Neuromag naming: MEGxxx1 are magnetometers, MEGxxx2 / MEGxxx3 gradiometers
+    if ch_name.endswith('1'):
+        return 'mag'
+    if ch_name.endswith(('2', '3')):
+        return 'grad'
+    return None
+
+
+def compile_answer_data(answer_data):
+    """ Flatten the nested answer dict into the two lookup tables. """
+    bad_channels = {}
+
+    def _add(key, ch_name):
+        bad_channels.setdefault(key, set()).add(ch_name)
+
+    for subj, sessions in answer_data.get("badC_EEG", {}).items():
+        for ses, runs in sessions.items():
+            for run, chans in runs.items():
+                for ch_name in chans:
+                    _add((subj, ses, run, 'eeg'), ch_name)
+
+    for subj, sessions in answer_data.get("badC_MEG", {}).items():
+        for ses, runs in sessions.items():
+            for run, chans in runs.items():
+                for ch_name in chans:
+                    ch_type = _meg_channel_type(ch_name)
+                    if ch_type is not None:
+                        _add((subj, ses, run, ch_type), ch_name)
+
+    bad_components = {}
+    for subj, sessions in answer_data.get("ICA_remove_inds", {}).items():
+        for ses, runs in sessions.items():
+            for run, ch_types in runs.items():
+                for ch_type, comps in ch_types.items():
+                    bad_components[(subj, ses, run, ch_type)] = frozenset(comps)
+
+    bad_channels = {key: frozenset(chans) for key, chans in bad_channels.items()}
+    return AnswerKey(bad_channels, bad_components)
+
+
+def _stamp(st):
+    return (st.st_mtime_ns, st.st_size)
+
+
+def load_answer_key(json_path, missing_ok=False):
+    """
+    The compiled answer key for `json_path`. Served from memory while the JSON is
+    unchanged, else from the pickled index next to it, else compiled from the JSON.
+    A missing JSON raises FileNotFoundError, or gives an empty key if `missing_ok`.
+    """
+    json_path = os.path.abspath(json_path)
+    try:
+        stamp = _stamp(os.stat(json_path))
+    except FileNotFoundError:
+        if missing_ok:
+            return AnswerKey({}, {})
+        raise
+
+    key = _loaded.get(json_path)
+    if key is not None and key.stamp == stamp:
+        return key
+
+    index_path = json_path + '.idx.pkl'
+    key = None
+    try:
+        with open(index_path, 'rb') as f:
+            cached = pickle.load(f)
+        if cached.get("version") == INDEX_VERSION and cached.get("stamp") == stamp:
+            key = cached["key"]
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, KeyError):
+        key = None
+
+    if key is None:
+        with open(json_path, 'r') as f:
+            key = compile_answer_data(json.load(f))
+        try:
+            tmp_path = index_path + f'.{os.getpid()}.tmp'
+            with open(tmp_path, 'wb') as f:
+                pickle.dump({"version": INDEX_VERSION, "stamp": stamp, "key": key}, f)
+            os.replace(tmp_path, index_path)
+        except OSError:
+            # Read-only answer dir: the in-memory copy still works
+            pass
+
+    key.stamp = stamp
+    _loaded[json_path] = key
+    return key
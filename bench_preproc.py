@@ -0,0 +1,248 @@
+# bench_preproc.py
+# Benchmarks of the preprocessing stages on synthetic Neuromag-like recordings,
+# so scaling can be measured without real data.
+# e.g. python bench_preproc.py --n-sensors 34 102 --durations 60 600 --sfreqs 500 1000
+# Results (wall time, peak RSS, bytes written per stage) go to a JSON file.
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import threading
+import numpy as np
+import mne
+import config
+from filter_plan import notch_freqs, apply_filter_plan
+from preproc_funcs import fit_and_save_ica, select_channels_batch, channel_type_indices
+from trial_io import save_trial
+
+STAGES = ('load', 'notch', 'filter', 'filter_plan', 'ica', 'trial_select', 'trial_write')
+
+
+# -------------------------------
+#      SYNTHETIC RECORDINGS
+# -------------------------------
+def make_synthetic_raw(n_sensors=102, n_eeg=60, duration=60., sfreq=1000., line_freq=50., seed=0):
+    """
+    RawArray with Neuromag naming: per sensor one magnetometer (MEGxxx1) and two
+    gradiometers (MEGxxx2, MEGxxx3), plus EEGxxx channels. Data are 1/f-like noise
+    with line noise and its harmonics, scaled to typical amplitudes per type.
+    """
+    ch_names, ch_types = [], []
+    for i in range(1, n_sensors + 1):
+        ch_names += [f"MEG{i:03d}1", f"MEG{i:03d}2", f"MEG{i:03d}3"]
+        ch_types += ['mag', 'grad', 'grad']
+    ch_names += [f"EEG{i:03d}" for i in range(1, n_eeg + 1)]
+    ch_types += ['eeg'] * n_eeg
+    info = mne.create_info(ch_names, sfreq, ch_types)
+
+    rng = np.random.default_rng(seed)
+    n_times = int(duration * sfreq)
+    data = np.cumsum(rng.standard_normal((len(ch_names), n_times)), axis=1)
+    data -= np.linspace(data[:, 0], data[:, -1], n_times, axis=1)  # keep the walk bounded
+    data += 5 * rng.standard_normal(data.shape)
+    t = np.arange(n_times) / sfreq
+    for k, f in enumerate(notch_freqs(line_freq), start=1):
+        if f < sfreq / 2:
+            data += (20. / k) * np.sin(2 * np.pi * f * t)
+    scale = {'mag': 1e-14, 'grad': 1e-12, 'eeg': 1e-6}
+    data *= np.array([scale[ch_type] for ch_type in ch_types])[:, None]
+    return mne.io.RawArray(data, info, verbose=False)
+
+
+# -------------------------------
+#          MEASUREMENT
+# -------------------------------
+def _current_rss():
+    """ Resident set size in bytes (psutil if installed, else /proc, else None). """
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        pass
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+class _Measure:
+    """ Wall time and peak RSS (sampled in a thread) of the enclosed block. """
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+
+    def _sample(self):
+        while not self._stop.is_set():
+            rss = _current_rss()
+            if rss is not None:
+                self.peak = max(self.peak, rss)
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self.start_rss = _current_rss() or 0
+        self.peak = self.start_rss
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.wall = time.perf_counter() - self._t0
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, _current_rss() or 0)
+        return False
+
+
+def _dir_bytes(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(root, f)) for f in files)
+    return total
+
+
+# -------------------------------
+#            STAGES
+# -------------------------------
+def bench_case(case, stages, work_dir, n_trials, total_channels, snippet_length, n_components):
+    """ Run the requested stages on one synthetic recording, return one record per stage. """
+    records = []
+
+    def record(stage, m, bytes_written=0):
+        records.append(dict(
+            case,
+            stage=stage,
+            wall_s=round(m.wall, 6),
+            peak_rss_mb=round(m.peak / 2**20, 2),
+            rss_delta_mb=round((m.peak - m.start_rss) / 2**20, 2),
+            bytes_written=int(bytes_written),
+        ))
+        print(f"  {stage:<13} {m.wall:8.3f}s  peak RSS {m.peak / 2**20:8.1f} MB  written {bytes_written / 2**20:8.2f} MB")
+
+    raw_path = os.path.join(work_dir, 'S0_ses0_run00_raw.fif')
+    make_synthetic_raw(
+        case['n_sensors'], case['n_eeg'], case['duration'], case['sfreq']
+    ).save(raw_path, overwrite=True, verbose=False)
+
+    with _Measure() as m:
+        raw = mne.io.read_raw(raw_path, preload=True, allow_maxshield=True, verbose=False)
+    if 'load' in stages:
+        record('load', m)
+
+    notch = [f for f in notch_freqs(config.notch_freq) if f < raw.info['sfreq'] / 2]
+    h_freq = min(config.h_freq, raw.info['sfreq'] / 2 - 1)
+    unfiltered = raw.copy() if 'filter_plan' in stages else None
+
+    if 'notch' in stages:
+        with _Measure() as m:
+            raw.notch_filter(freqs=notch, verbose=False)
+        record('notch', m)
+    if 'filter' in stages:
+        with _Measure() as m:
+            raw.filter(l_freq=config.l_freq, h_freq=None, fir_design='firwin', verbose=False)
+            raw.filter(l_freq=None, h_freq=h_freq, fir_design='firwin', verbose=False)
+        record('filter', m)
+    if 'filter_plan' in stages:
+        # notch + high-pass + low-pass together, to compare with the two rows above
+        notch_freq = config.notch_freq if len(notch) == len(notch_freqs(config.notch_freq)) else None
+        with _Measure() as m:
+            apply_filter_plan(unfiltered, config.l_freq, h_freq, notch_freq)
+        record('filter_plan', m)
+        del unfiltered
+
+    if 'ica' in stages:
+        ica_dir = os.path.join(work_dir, 'ica')
+        with _Measure() as m:
+            fit_and_save_ica(raw, ica_dir, 'S0_ses0_run00_grad_ica.fif', 'grad',
+                             n_components=n_components, method=config.ica_method,
+                             random_state=config.ica_seed, catalog_path=None, precompute=False)
+        record('ica', m, _dir_bytes(ica_dir))
+
+    bad_channels = ['MEG0011', 'MEG0022', 'MEG0033', 'MEG0042']
+    with _Measure() as m:
+        picks, is_bad = select_channels_batch(
+            raw.ch_names, bad_channels, 'grad', n_trials,
+            total_channels=total_channels, type_indices=channel_type_indices(raw.ch_names)
+        )
+    if 'trial_select' in stages:
+        record('trial_select', m)
+
+    if 'trial_write' in stages:
+        trials_dir = os.path.join(work_dir, 'trials')
+        os.makedirs(trials_dir, exist_ok=True)
+        n_snippet = raw.n_times if snippet_length is None else min(raw.n_times, int(snippet_length * raw.info['sfreq']))
+        with _Measure() as m:
+            for row in range(n_trials):
+                save_trial(
+                    raw, os.path.join(trials_dir, f"S0_ses0_run00_trial_{row}_1_grad"),
+                    picks[row][picks[row] >= 0],
+                    [raw.ch_names[k] for k in picks[row][is_bad[row]]],
+                    'grad', start=0, stop=n_snippet
+                )
+        record('trial_write', m, _dir_bytes(trials_dir))
+
+    return records
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark preprocessing stages on synthetic Neuromag-like recordings."
+    )
+    parser.add_argument("--n-sensors", type=int, nargs="+", default=[102], help="MEG sensor triplets (1 mag + 2 grad each), one case per value (default=102).")
+    parser.add_argument("--n-eeg", type=int, default=60, help="EEG channels (default=60).")
+    parser.add_argument("--durations", type=float, nargs="+", default=[60.], help="Recording durations in seconds (default=60).")
+    parser.add_argument("--sfreqs", type=float, nargs="+", default=[1000.], help="Sampling rates in Hz (default=1000).")
+    parser.add_argument("--stages", nargs="+", default=list(STAGES), choices=STAGES, help="Stages to run (default: all).")
+    parser.add_argument("--n-trials", type=int, default=100, help="Trials selected/written per case (default=100).")
+    parser.add_argument("--total-channels", type=int, default=config.total_channels, help="Channels per trial (default=15).")
+    parser.add_argument("--snippet-length", type=float, default=None, help="Seconds per written trial (default: whole recording).")
+    parser.add_argument("--n-components", type=int, default=20, help="ICA components (default=20).")
+    parser.add_argument("--output", type=str, default=os.path.join('data', 'bench', 'preproc_bench.json'), help="Output JSON file.")
+    args = parser.parse_args()
+
+    mne.set_log_level('WARNING')
+    records = []
+    for n_sensors in args.n_sensors:
+        for duration in args.durations:
+            for sfreq in args.sfreqs:
+                case = dict(
+                    n_sensors=n_sensors,
+                    n_eeg=args.n_eeg,
+                    n_channels=3 * n_sensors + args.n_eeg,
+                    duration=duration,
+                    sfreq=sfreq,
+                )
+                print(f"\n=== {case['n_channels']} channels | {duration:g} s | {sfreq:g} Hz ===")
+                work_dir = tempfile.mkdtemp(prefix='meg_chicken_bench_')
+                try:
+                    records += bench_case(case, args.stages, work_dir, args.n_trials,
+                                          args.total_channels, args.snippet_length, args.n_components)
+                finally:
+                    shutil.rmtree(work_dir, ignore_errors=True)
+
+    results = {
+        "created": time.strftime('%Y-%m-%dT%H:%M:%S'),
+        "python": sys.version.split()[0],
+        "mne": mne.__version__,
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "args": vars(args),
+        "records": records,
+    }
+    out_dir = os.path.dirname(args.output)
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\n[DONE] {len(records)} measurements saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
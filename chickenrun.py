@@ -1,24 +1,79 @@
-import os
 import time
-import json
-import numpy as np
-import mne
+_STARTUP_T0 = time.perf_counter()  # before any other import, for the startup report
+import os
+import threading
 import tkinter as tk
 from tkinter import messagebox
-import pickle
-import csv
-import matplotlib
-import matplotlib.pyplot as plt
 import warnings
 import config
-import run_funcs
-from ica_plot import custome_ica_plot
-from FeedbackWindow import FeedbackWindow, TrialResultWindow, TrialEndWindow
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-from matplotlib.figure import Figure
-# ============ MNE Matplotlib settings ============
-mne.viz.set_browser_backend('matplotlib')
-matplotlib.use('tkagg')
+import recording_cache
+import results_store
+from answer_key import load_answer_key
+
+# The heavy modules (mne, matplotlib, scipy via run_funcs, the MNE viz helpers of
+# ica_plot) are imported by _warm_up on a background thread while the participant
+# fills in the form, so the first window appears without waiting for them.
+# They are bound as module globals; on_submit waits for the warm-up to finish.
+_warmup_done = threading.Event()
+_warmup_error = None
+
+
+def _import_heavy_modules():
+    global np, mne, matplotlib, plt, run_funcs, load_trial, TRIAL_HEADER_EXT
+    global load_topo_grid, load_ica_props, custome_ica_plot, TraceViewer, EnvelopePyramid
+    global FeedbackWindow, TrialResultWindow, TrialEndWindow, preload_feedback_images
+    global FigureCanvasTkAgg, Figure, display_slides, preload_slides
+    import numpy as np
+    import matplotlib
+    # ============ MNE Matplotlib settings ============
+    matplotlib.use('tkagg')
+    import matplotlib.pyplot as plt
+    import mne
+    mne.viz.set_browser_backend('matplotlib')
+    import run_funcs
+    from trial_io import load_trial, TRIAL_HEADER_EXT
+    from topo_grid import load_topo_grid
+    from ica_props import load_ica_props
+    from ica_plot import custome_ica_plot
+    from trace_viewer import TraceViewer, EnvelopePyramid
+    from FeedbackWindow import FeedbackWindow, TrialResultWindow, TrialEndWindow, preload_feedback_images
+    from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+    from matplotlib.figure import Figure
+    try:
+        from slides import display_slides, preload_slides
+    except ImportError:
+        def display_slides(*args, **kwargs):
+            pass
+
+        def preload_slides(*args, **kwargs):
+            pass
+
+
+def _warm_up():
+    """
+    Heavy imports, feedback sounds and images, then one off-screen draw to build the
+    font cache and text layout. The slides are decoded meanwhile on their own thread.
+    """
+    global _warmup_error
+    t0 = time.perf_counter()
+    try:
+        _import_heavy_modules()
+        preload_slides(config.slide_dir)
+        import feedback_audio
+        feedback_audio.preload()
+        preload_feedback_images()
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        fig = Figure(figsize=(2, 2))
+        ax = fig.subplots()
+        ax.plot([0, 1], [0, 1])
+        ax.set_title("warm-up")
+        FigureCanvasAgg(fig).draw()
+    except Exception as e:
+        _warmup_error = e
+    finally:
+        print(f"[STARTUP] Warm-up done in {time.perf_counter() - t0:.2f}s")
+        _warmup_done.set()
+
 
 warnings.filterwarnings(
     'ignore',
@@ -26,12 +81,6 @@ warnings.filterwarnings(
     category=RuntimeWarning
 )
 
-try:
-    from slides import display_slides
-except ImportError:
-    def display_slides(*args, **kwargs):
-        pass
-
 class MEG_Chicken:
     def __init__(self):
         """ The main window for collecting participant info. """
@@ -40,7 +89,8 @@ class MEG_Chicken:
 
         self.open_windows = [] # To register the opened windows so that we can actually close them all...
         self.results = []  # store trial-wise dict
-        self.trial_accuracies = []
+        self.trial_accuracies = []  # history for re-creating a closed result window
+        self.metrics = None  # run_funcs.RunningMetrics of the session
 
         # Flag for user decision to Save & Quit mid-experiment
         self.user_wants_to_quit = False
@@ -84,8 +134,40 @@ class MEG_Chicken:
         cb_grad = tk.Checkbutton(self.window, text="Grad", variable=self.grad_var)
         cb_grad.grid(row=6, column=2, sticky="w")
 
-        submit_button = tk.Button(self.window, text="Submit", command=self.on_submit)
-        submit_button.grid(row=7, column=0, columnspan=3)
+        self.submit_button = tk.Button(self.window, text="Submit", command=self.on_submit)
+        self.submit_button.grid(row=7, column=0, columnspan=3)
+
+        self.window.bind("<Map>", self._report_first_window, add="+")
+        threading.Thread(target=_warm_up, name="warm-up", daemon=True).start()
+
+    def _report_first_window(self, event):
+        """ Time-to-first-window: from the start of this module to the form being mapped. """
+        if event.widget is self.window:
+            self.window.unbind("<Map>")
+            print(f"[STARTUP] First window after {time.perf_counter() - _STARTUP_T0:.2f}s")
+
+    def _wait_for_warm_up(self):
+        """
+        Block (keeping the form responsive) until the heavy modules are loaded.
+        Submit is disabled meanwhile so a second click cannot start another session.
+        Returns False if the form was closed while waiting.
+        """
+        if not _warmup_done.is_set():
+            self.submit_button.config(state="disabled")
+            self.window.config(cursor="watch")
+            while not _warmup_done.wait(timeout=0.02):
+                self._pump_events()
+            try:
+                if not self.window.winfo_exists():
+                    return False
+            except tk.TclError:
+                return False
+            self.window.config(cursor="")
+            self.submit_button.config(state="normal")
+        if _warmup_error is not None:
+            # Import again here so the real error surfaces with its traceback
+            _import_heavy_modules()
+        return True
 
     def create_label_entry(self, window, text, row):
         label = tk.Label(window, text=text)
@@ -114,6 +196,9 @@ class MEG_Chicken:
         #     messagebox.showerror("Invalid Input", "Experience level must be 1 ~ 4.")
         #     return
 
+        if not self._wait_for_warm_up():
+            return
+
         # Show instructions if needed
         if show_instruc:
             self.show_instructions()
@@ -159,9 +244,8 @@ class MEG_Chicken:
         messagebox.showinfo("Instructions - Page 2", instructions2)
         messagebox.showinfo("Instructions - Page 3", instructions3)
 
-        slide_folder = 'slides'
-        if os.path.exists(slide_folder):
-            display_slides(slide_folder, master=self.window)
+        if os.path.exists(config.slide_dir):
+            display_slides(config.slide_dir, master=self.window)
 
     def run_experiment(self,
                        participant_number,
@@ -174,73 +258,45 @@ class MEG_Chicken:
                        channel_types=None):
         """
         Output: 
-        1. trial results in CSV.
-        2. Experiment response time in CSV
+        1. trial results in the results store (results_store.py, exportable to CSV).
+        2. Experiment response time in the results store
         3. Run the rest of the trial if session is created but not completed
         4. Allowing to Save and Quit mid-session and resume next time
         """
         if channel_types is None:
             channel_types = ["eeg", "mag", "grad"]
 
-        session_id = f"{participant_number}_{session_number}"
-        session_dir = config.session_dir
-        os.makedirs(session_dir, exist_ok=True)
-        session_file_path = os.path.join(session_dir, f"{session_id}_{'ICA' if mode_ica else 'MEEG'}.pkl")
-        
-        os.makedirs(config.res_dir, exist_ok=True)
-        output_csv = os.path.join(
-            config.res_dir,
-            f"results_{participant_number}_{session_number}_{'ICA' if mode_ica else 'MEEG'}_{'exp' if feedback else 'ctrl'}.csv"
-        )
-
-        completed_trial_ids = set()
-        if os.path.exists(output_csv):
-            with open(output_csv, "r", newline="") as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    try:
-                        row["Trial"] = int(row["Trial"])
-                    except ValueError:
-                        continue
-                    for num_field in ["Hits","FalseAlarms","Misses","CorrectRejections"]:
-                        if num_field in row:
-                            row[num_field] = int(row[num_field])
-                    for float_field in ["StartTime_s","EndTime_s","Accuracy"]:
-                        if float_field in row:
-                            row[float_field] = float(row[float_field])
-
-                    completed_trial_ids.add(row["Trial"])                    
-                    # Store the row in self.results
-                    self.results.append(row)
-                    if "Accuracy" in row:
-                        self.trial_accuracies.append(row["Accuracy"])
-
-        # If no file exist for corresponding session id, we create one 
-        if not os.path.exists(session_file_path):
-            trials_list = []
+        mode = 'ICA' if mode_ica else 'MEEG'
+        condition = 'exp' if feedback else 'ctrl'
+        store = results_store.ResultsStore()
+        self._result_key = (participant_number, session_number, mode, condition)
+
+        # Completed trials of this session: one indexed query
+        self.results = store.results(*self._result_key)
+        completed_trial_ids = {row["Trial"] for row in self.results}
+        self.trial_accuracies.extend(row["Accuracy"] for row in self.results)
+        self.metrics = run_funcs.RunningMetrics()
+        for row in self.results:
+            self.metrics.add(row["ChannelType"], row["Hits"], row["FalseAlarms"], row["Misses"], row["CorrectRejections"])
+
+        # The session's trial plan, created on first start and reused on resume
+        def make_plan():
             if mode_ica:
                 data_path = config.ica_dir
                 all_files = run_funcs.collect_files(data_path, channel_types, '_ica.fif', 'ICA')
-                if all_files is None:
-                    return
-                trials_list = run_funcs.process_trial_files(all_files, n_trials, 'ICA', data_path)
-            
             else:
                 data_path = config.trials_dir
-                all_files = run_funcs.collect_files(data_path, channel_types, '.pkl', 'MEEG')
-                if all_files is None:
-                    return
-                trials_list = run_funcs.process_trial_files(all_files, n_trials, 'MEEG', data_path)
-            
-            # Save session file
-            with open(session_file_path, "wb") as f_pkl:
-                pickle.dump(trials_list, f_pkl)
-            print(f"Session file created: {session_file_path}, total trials={len(trials_list)}")
-        else:
-            # If exist, load
-            with open(session_file_path, "rb") as f_pkl:
-                trials_list = pickle.load(f_pkl)
-            print(f"Session file found. Total trials in session file: {len(trials_list)}")
+                all_files = run_funcs.collect_files(data_path, channel_types, TRIAL_HEADER_EXT, 'MEEG')
+            if all_files is None:
+                return None
+            return run_funcs.process_trial_files(all_files, n_trials, mode, data_path)
+
+        trials_list = store.session_plan(participant_number, session_number, mode, make_plan)
+        if trials_list is None:
+            store.close()
+            return
+        print(f"Session {participant_number}_{session_number} ({mode}): total trials={len(trials_list)}")
+        self.store = store
 
         # 4) Filter out the completed trials
         remaining_trials = [t for t in trials_list if t["Trial"] not in completed_trial_ids]
@@ -248,6 +304,7 @@ class MEG_Chicken:
         print("completed_trial_ids", completed_trial_ids)
         if len(remaining_trials) == 0:
             messagebox.showinfo("All Trials Done", "All trials have been completed for this session!")
+            store.close()
             self._close_all_windows() 
             return        
                 
@@ -255,10 +312,16 @@ class MEG_Chicken:
         self.trial_result_window = TrialResultWindow(master=self.window)
         self.open_windows.append(self.trial_result_window.master)
 
+        # Trial N+1 is loaded in the background while trial N is on screen
+        prefetcher = run_funcs.TrialPrefetcher(
+            remaining_trials, self._load_trial_data, lookahead=config.prefetch_lookahead
+        )
+
         for trial_idx, trial_info in enumerate(remaining_trials, start= len(completed_trial_ids) + 1):
             print(trial_idx)
             if self.user_wants_to_quit:
                 break
+            loaded = prefetcher.get(trial_idx - len(completed_trial_ids) - 1, idle=self._pump_events)
 
             if trial_info["mode"] == "ICA":
             # =======================================================
@@ -268,34 +331,12 @@ class MEG_Chicken:
                 ica_filename = os.path.basename(trial_info["trial_path"])
                 print(f"[ICA] Trial {trial_idx}/{config.n_trials_per_session} => {ica_filename} (ch={ch_type})")
 
-                name_split = ica_filename.split('_')
-                try:
-                    subj, ses, run = name_split[0], name_split[1], name_split[2]
-                except IndexError:
-                    subj, ses, run = "unknown_subj", "unknown_ses", "unknown_run"
-
-                ica = mne.preprocessing.read_ica(trial_info["trial_path"])
-
-                raw_file_name = f"{subj}_{ses}_{run}_preprocessed_raw.fif"
-                raw_file_path = os.path.join(config.preprocessed_save_path, raw_file_name)
-                if not os.path.exists(raw_file_path):
-                    print(f"Cannot find {raw_file_path}. Skipping trial.")
+                if loaded is None:
+                    print(f"Cannot find the preprocessed recording for {ica_filename}. Skipping trial.")
                     continue
-                raw_preprocessed = mne.io.read_raw_fif(raw_file_path, preload=True, allow_maxshield=True)
-
-                # Answers
-                ica_remove = {}
-                answer_dir = config.answer_dir
-                answer_data_file = 'answer_standardized.json'
-                answer_data_path = os.path.join(answer_dir, answer_data_file)
-                if os.path.exists(answer_data_path):
-                    with open(answer_data_path, 'r') as file:
-                        answer_data = json.load(file)
-                    ica_remove = answer_data.get("ICA_remove_inds", {})
-                bad_components = []
-                if (subj in ica_remove) and (ses in ica_remove[subj]) and (run in ica_remove[subj][ses]) and (ch_type in ica_remove[subj][ses][run]):
-                    bad_components = ica_remove[subj][ses][run][ch_type]
-                
+                ica = loaded["ica"]
+                bad_components = loaded["bad_components"]
+
                 print(bad_components)
 
                 fig = custome_ica_plot(
@@ -303,11 +344,14 @@ class MEG_Chicken:
                     ICA_remove_inds_list=bad_components,
                     feedback=feedback,
                     deselect=deselect,
-                    inst=raw_preprocessed,
+                    # Resolved per click through the cache, so the trial does not pin the recording
+                    inst=lambda key=loaded["recording"]: recording_cache.get_preprocessed_raw(*key),
                     nrows=5,
                     ncols=10,
                     master=self.window,
-                    title=f"Trial {trial_idx} - {ch_type}"
+                    title=f"Trial {trial_idx} - {ch_type}",
+                    topo_grid=loaded["topo_grid"],
+                    props=loaded["props"]
                 )
 
                 # Trial start time after plotting since it takes some time to initialize
@@ -343,7 +387,9 @@ class MEG_Chicken:
                     if summary_window.user_wants_quit:
                         self.user_wants_to_quit = True
                     
-                    self._update_accuracy_safely(trial_idx, accuracy)
+                    self._update_accuracy_safely(
+                        trial_idx, accuracy, ch_type, (hits, false_alarms, misses, correct_rejections)
+                    )
 
                     
                     row_dict = {
@@ -359,7 +405,7 @@ class MEG_Chicken:
                         'CorrectRejections': correct_rejections,
                         'Accuracy': accuracy
                     }
-                    self._append_result_to_csv(row_dict, output_csv)
+                    self._store_result(row_dict)
 
                 cid_close = fig.canvas.mpl_connect('close_event', on_close_ica_fig)
 
@@ -371,8 +417,7 @@ class MEG_Chicken:
                 # ===================================================================
                 file_path = trial_info["trial_path"]
                 print(file_path)
-                with open(file_path, 'rb') as f:
-                    tdict = pickle.load(f)
+                tdict = loaded
                 trial_data = tdict["data"]
                 bad_channels_in_display = tdict["bad_chans_in_display"]
                 channel_type = tdict.get("channel_type", "Unknown")
@@ -400,6 +445,7 @@ class MEG_Chicken:
                                 if feedback:
                                     is_correct = (ch_name in bad_channels_in_display)
                                     FeedbackWindow(self.window, is_correct)
+                            viewer.set_selected(ch_name, ch_name in selected_channels)
 
                 def end_trial():
                     fig.canvas.mpl_disconnect(cid_pick)
@@ -426,7 +472,9 @@ class MEG_Chicken:
                     if summary_window.user_wants_quit:
                         self.user_wants_to_quit = True
                     
-                    self._update_accuracy_safely(trial_idx, accuracy)
+                    self._update_accuracy_safely(
+                        trial_idx, accuracy, channel_type, (hits, false_alarms, misses, correct_rejections)
+                    )
 
                     trial_end_time = time.time()
                     row_dict = {
@@ -442,7 +490,7 @@ class MEG_Chicken:
                         'CorrectRejections': correct_rejections,
                         'Accuracy': accuracy
                     }
-                    self._append_result_to_csv(row_dict, output_csv)
+                    self._store_result(row_dict)
 
                 def on_key(event):
                     if event.key == 'tab':
@@ -451,12 +499,13 @@ class MEG_Chicken:
                 def on_close(event):
                     end_trial()
 
-                fig = trial_data.plot(
-                    n_channels=n_channels,
+                viewer = TraceViewer(
+                    trial_data,
                     duration=2,
-                    block=False,
-                    title=f"Trial {trial_idx} - {channel_type}"
+                    title=f"Trial {trial_idx} - {channel_type}",
+                    pyramid=tdict.get("pyramid")
                 )
+                fig = viewer.fig
                 cid_pick = fig.canvas.mpl_connect('pick_event', on_pick)
                 cid_key = fig.canvas.mpl_connect('key_press_event', on_key)
                 cid_close = fig.canvas.mpl_connect('close_event', on_close)
@@ -466,6 +515,9 @@ class MEG_Chicken:
             if self.user_wants_to_quit:
                 break
 
+        prefetcher.close()
+        self.store.close()
+
         if not self.user_wants_to_quit:
             self.show_final_report(self.results)
         else:
@@ -473,24 +525,58 @@ class MEG_Chicken:
             self._close_all_windows()
 
 
-    def _append_result_to_csv(self, row_dict, csv_path):
+    def _load_trial_data(self, trial_info):
         """
-        Append one trial row to an existing or new CSV file.
-        Also store it to self.results in memory.
+        All blocking I/O of one trial; runs on the prefetch thread.
+        ICA: dict with the ICA, the (subj, ses, run) of the preprocessed recording
+        and the answer, or None if the preprocessed recording is missing. Both the
+        ICA and the recording are loaded into recording_cache.
+        MEEG: the trial dict from trial_io.load_trial, plus the envelope pyramid
+        of the trace viewer ("pyramid").
         """
-        fieldnames = [
-            'Trial', 'StartTime_s', 'EndTime_s', 'ChannelType',
-            'SelectedChannels', 'BadChannels',
-            'Hits', 'FalseAlarms', 'Misses', 'CorrectRejections',
-            'Accuracy'
-        ]
-        file_existed = os.path.exists(csv_path)
-        with open(csv_path, 'a', newline='') as csvfile:
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-            if not file_existed or os.path.getsize(csv_path) == 0:
-                writer.writeheader()
-            writer.writerow(row_dict)
+        if trial_info["mode"] != "ICA":
+            tdict = load_trial(trial_info["trial_path"])
+            tdict["pyramid"] = EnvelopePyramid(tdict["data"].get_data())
+            return tdict
+
+        ch_type = trial_info["ch_type"]
+        name_split = os.path.basename(trial_info["trial_path"]).split('_')
+        try:
+            subj, ses, run = name_split[0], name_split[1], name_split[2]
+        except IndexError:
+            subj, ses, run = "unknown_subj", "unknown_ses", "unknown_run"
+
+        if not os.path.exists(recording_cache.preprocessed_raw_path(subj, ses, run)):
+            return None
+
+        # Copy: the plot edits ica.exclude, the cached solution must stay untouched
+        ica = recording_cache.get_ica(trial_info["trial_path"]).copy()
+        recording_cache.get_preprocessed_raw(subj, ses, run)
+
+        # Answers
+        answer_key = load_answer_key(config.answer_file, missing_ok=True)
+        bad_components = sorted(answer_key.bad_components(subj, ses, run, ch_type))
+        return {
+            "ica": ica,
+            "topo_grid": load_topo_grid(trial_info["trial_path"]),
+            "props": load_ica_props(trial_info["trial_path"]),
+            "recording": (subj, ses, run),
+            "bad_components": bad_components
+        }
+
+    def _pump_events(self):
+        """ Keep the Tk windows responsive while waiting for a trial to load. """
+        try:
+            self.window.update()
+        except tk.TclError:
+            pass
 
+    def _store_result(self, row_dict):
+        """
+        Write one trial row to the results store (one transaction).
+        Also store it to self.results in memory.
+        """
+        self.store.add_result(*self._result_key, row_dict)
         self.results.append(row_dict)
 
 
@@ -656,8 +742,10 @@ class MEG_Chicken:
         except:
             pass
 
-    def _update_accuracy_safely(self, trial_idx, accuracy):
+    def _update_accuracy_safely(self, trial_idx, accuracy, ch_type, counts):
+        """ counts: (hits, false_alarms, misses, correct_rejections) of the trial. """
         self.trial_accuracies.append(accuracy)
+        self.metrics.add(ch_type, *counts)
         try:
             if (not self.trial_result_window) or (not self.trial_result_window.master.winfo_exists()):
                 print("Re-creating the trial result window because it was closed")
@@ -668,7 +756,13 @@ class MEG_Chicken:
             print("Main app is destroyed.")
             return
 
-        self.trial_result_window.set_accuracies(self.trial_accuracies)
+        window = self.trial_result_window
+        if window.plot_created:
+            window.add_accuracy(accuracy)
+        else:
+            # New or re-created window: draw the history once, then append from there on
+            window.set_accuracies(self.trial_accuracies)
+        window.set_metrics(self.metrics.summaries())
 # ----------------------- Main ----------------------
 if __name__ == "__main__":
     app = MEG_Chicken()
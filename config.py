@@ -6,15 +6,25 @@ trials_dir = os.path.join('data', 'trials')
 ica_dir = os.path.join('data', 'ica')
 preprocessed_save_path = os.path.join('data', 'preprocessed')
 res_dir = os.path.join('data', 'results')
+results_db = os.path.join(res_dir, 'results.sqlite')  # Sessions, trial plans and results of all participants
 sample_dir = os.path.join('data', 'sample')
 session_dir = os.path.join('data', 'session_data')
 answer_dir = os.path.join('data', 'answer')
+cache_dir = os.path.join('data', 'cache')  # Filtered recordings, keyed by file content + filter settings
+answer_file = os.path.join(answer_dir, 'answer_standardized.json')
+trial_catalog = os.path.join('data', 'trial_catalog.sqlite')  # Index of all trials and ICA files
 nest_dir = os.path.join('data', 'nest') # Where the chicken lay eggs. HA! Get it?
 
 # Experiment setups
 n_trials_per_session = 5
+prefetch_lookahead = 1  # Trials loaded in the background ahead of the one on screen
+slide_dir = 'slides'  # Tutorial slides shown before the first session
+slide_cache_size = 64  # Max slides kept decoded (scaled to the display size) in memory
+recording_cache_bytes = 2 * 1024**3  # Memory budget for preprocessed recordings + ICAs kept between ICA trials (default=2 GB)
+recording_cache_entries = 32  # Max recordings + ICAs kept between ICA trials, whatever their size
 
 # ICA settings
+ica_lazy_data = True  # Open preprocessed recordings without preload in ICA mode; data are read on demand
 ica_components = 50 
 ica_method = 'fastica'
 ica_seed = 42
@@ -23,10 +33,13 @@ ica_seed = 42
 l_freq = 0.1  # High-pass filter cutoff (default=0.1 Hz)
 h_freq = 80.0  # Low-pass filter cutoff (default=80 Hz)
 notch_freq = 50.0  # Base notch filter frequency (default=50 Hz)
+stream_chunk_duration = 60.0  # Seconds read per chunk in streaming mode (default=60 s)
 
 # Trial settings
 n_versions = 3  # Number of trial-version repeats (default=3)
 trials_per_file = 5  # Trials per version per channel_type (default=5)
 total_channels = 15  # Number of channels in each snippet (default=15)
 max_bad_ch = 3  # Max bad channels forced in snippet (default=3)
-min_bad_ch = 1  # Min bad channels forced in snippet (default=1)
\ No newline at end of file
+min_bad_ch = 1  # Min bad channels forced in snippet (default=1)
+snippet_length = None  # Seconds of data kept per trial (default=None, whole recording)
+snippet_offset = 'random'  # Snippet start in seconds, or 'random' / 'spread' (default='random')
\ No newline at end of file
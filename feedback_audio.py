@@ -0,0 +1,66 @@
+# feedback_audio.py
+# Feedback sounds (resource/correct.mp3, resource/wrong.mp3), played without
+# blocking the Tk loop. preload() decodes both files once into memory; play()
+# returns immediately.
+# Backends, first available wins:
+#   pygame.mixer : sounds decoded once into in-memory buffers, mixed asynchronously
+#   playsound    : played from the file on a daemon thread (no preload)
+#   none         : silent
+import os
+import threading
+
+SOUNDS = {
+    'correct': os.path.join('resource', 'correct.mp3'),
+    'wrong': os.path.join('resource', 'wrong.mp3'),
+}
+
+_lock = threading.Lock()
+_backend = None  # 'pygame' | 'playsound' | 'none', set by preload()
+_buffers = {}
+
+
+def _load_pygame():
+    import pygame
+    pygame.mixer.init()
+    return {name: pygame.mixer.Sound(path) for name, path in SOUNDS.items() if os.path.exists(path)}
+
+
+def preload():
+    """ Pick a backend and decode the sounds. Safe to call from a worker thread, and more than once. """
+    global _backend, _buffers
+    with _lock:
+        if _backend is not None:
+            return _backend
+        try:
+            _buffers = _load_pygame()
+            _backend = 'pygame'
+        except Exception:
+            try:
+                import playsound  # noqa: F401
+                _backend = 'playsound'
+            except ImportError:
+                _backend = 'none'
+        print(f"[AUDIO] Feedback sounds: {_backend}")
+        return _backend
+
+
+def _play_file(path):
+    from playsound import playsound
+    try:
+        playsound(path)
+    except Exception:
+        pass
+
+
+def play(name):
+    """ Start the sound `name` ('correct' or 'wrong') and return at once. Never raises. """
+    backend = preload()
+    try:
+        if backend == 'pygame':
+            sound = _buffers.get(name)
+            if sound is not None:
+                sound.play()
+        elif backend == 'playsound' and os.path.exists(SOUNDS[name]):
+            threading.Thread(target=_play_file, args=(SOUNDS[name],), daemon=True).start()
+    except Exception:
+        pass
@@ -1,6 +1,7 @@
 # ica_plot.py
 import mne
 import copy
+import functools
 import matplotlib as plt
 import numpy as np
 from mne.viz import _get_plot_ch_type 
@@ -14,6 +15,8 @@ from mne.epochs import BaseEpochs
 from mne.io import BaseRaw
 
 from FeedbackWindow import FeedbackWindow
+from topo_grid import draw_topo
+from ica_props import component_sources
 
 
 # straight from defaults
@@ -22,6 +25,50 @@ _INTERPOLATION_DEFAULT = "cubic"
 _EXTRAPOLATE_DEFAULT = "auto"
 
 
+class _BlittedTitles:
+    """
+    Component titles of a topomap figure, redrawn one at a time by blitting.
+    The titles are animated: after every full draw their bounding boxes are
+    indexed for hit-testing and the background behind each one is cached, so a
+    click costs one array comparison and one title redraw, whatever the number
+    of components.
+    """
+    def __init__(self, fig, titles):
+        self.fig = fig
+        self.titles = titles
+        self._extents = np.full((len(titles), 4), np.nan)
+        self._backgrounds = [None] * len(titles)
+        for title in titles:
+            title.set_animated(True)
+        fig.canvas.mpl_connect("draw_event", self._on_draw)
+
+    def _on_draw(self, event):
+        boxes = [title.get_window_extent(event.renderer) for title in self.titles]
+        self._extents = np.array([box.extents for box in boxes]).reshape(-1, 4)
+        if getattr(self.fig.canvas, "supports_blit", False):
+            self._backgrounds = [self.fig.canvas.copy_from_bbox(box.padded(2)) for box in boxes]
+        for title in self.titles:
+            self.fig.draw_artist(title)
+
+    def hit(self, event):
+        """ Index of the title under the mouse event, or None. """
+        if event.x is None or event.y is None:
+            return None
+        x0, y0, x1, y1 = self._extents.T
+        hits = np.flatnonzero((x0 <= event.x) & (event.x <= x1) & (y0 <= event.y) & (event.y <= y1))
+        return int(hits[0]) if len(hits) else None
+
+    def redraw(self, index):
+        background = self._backgrounds[index]
+        if background is None:
+            self.fig.canvas.draw_idle()
+            return
+        title = self.titles[index]
+        self.fig.canvas.restore_region(background)
+        self.fig.draw_artist(title)
+        self.fig.canvas.blit(title.get_window_extent().padded(2))
+
+
 def custome_ica_plot(
     ica,
     ICA_remove_inds_list,
@@ -57,6 +104,8 @@ def custome_ica_plot(
     psd_args=None,
     verbose=None,
     master=None,
+    topo_grid=None,
+    props=None,
 ):
     """Project mixing matrix on interpolated sensor topography.
 
@@ -66,11 +115,13 @@ def custome_ica_plot(
         The ICA solution.
     %(picks_ica)s
     %(ch_type_topomap)s
-    inst : Raw | Epochs | None
+    inst : Raw | Epochs | callable | None
         To be able to see component properties after clicking on component
         topomap you need to pass relevant data - instances of Raw or Epochs
         (for example the data that ICA was trained on). This takes effect
-        only when running matplotlib in interactive mode.
+        only when running matplotlib in interactive mode. A callable
+        returning the instance is called on each click instead, so the
+        data can be served from (and evicted by) the recording cache.
     plot_std : bool | float
         Whether to plot standard deviation in ERP/ERF and spectrum plots.
         Defaults to True, which plots one standard deviation above/below.
@@ -129,6 +180,14 @@ def custome_ica_plot(
         interactive  mode. Ignored if ``inst`` is not supplied. If ``None``,
         nothing is passed. Defaults to ``None``.
     %(verbose)s
+    topo_grid : dict | None
+        Precomputed topomap images from ``topo_grid.load_topo_grid``. If given,
+        components are drawn from it with ``imshow`` instead of being
+        interpolated here (no contour lines).
+    props : dict | None
+        Precomputed component properties from ``ica_props.load_ica_props``. If
+        given, clicking a topomap draws them (``plot_ica_props``) instead of
+        computing the properties from ``inst``.
 
     Returns
     -------
@@ -225,27 +284,31 @@ def custome_ica_plot(
             # ↓↓↓ NOTE: we intentionally use the default norm=False here, so that
             # ↓↓↓ we get vlims that are symmetric-about-zero, even if the data for
             # ↓↓↓ a given component happens to be one-sided.
-            _vlim = _setup_vmin_vmax(data_, *vlim)
-            im = plot_topomap(
-                data_.flatten(),
-                pos,
-                ch_type=ch_type,
-                sensors=sensors,
-                names=names,
-                contours=contours,
-                outlines=outlines,
-                sphere=sphere,
-                image_interp=image_interp,
-                extrapolate=extrapolate,
-                border=border,
-                res=res,
-                size=size,
-                cmap=cmap[0],
-                vlim=_vlim,
-                cnorm=cnorm,
-                axes=ax,
-                show=False,
-            )[0]
+            if topo_grid is not None:
+                _vlim = tuple(topo_grid["vlims"][ii])
+                im = draw_topo(ax, topo_grid, ii, cmap=cmap[0], sensors=sensors)
+            else:
+                _vlim = _setup_vmin_vmax(data_, *vlim)
+                im = plot_topomap(
+                    data_.flatten(),
+                    pos,
+                    ch_type=ch_type,
+                    sensors=sensors,
+                    names=names,
+                    contours=contours,
+                    outlines=outlines,
+                    sphere=sphere,
+                    image_interp=image_interp,
+                    extrapolate=extrapolate,
+                    border=border,
+                    res=res,
+                    size=size,
+                    cmap=cmap[0],
+                    vlim=_vlim,
+                    cnorm=cnorm,
+                    axes=ax,
+                    show=False,
+                )[0]
 
             im.axes.set_label(ica._ica_names[ii])
             if colorbar:
@@ -262,20 +325,17 @@ def custome_ica_plot(
                 cbar.set_ticks(_vlim)
             _hide_frame(ax)
         del pos
+        blitted_titles = _BlittedTitles(fig, subplot_titles)
         fig.canvas.draw()
 
         # add title selection interactivity
-        def onclick_title(event, ica=ica, titles=subplot_titles, fig=fig):
+        def onclick_title(event, ica=ica, title_ics=[int(ic) for ic in picks], titles=blitted_titles):
             # check if any title was pressed
-            title_pressed = None
-            for title in titles:
-                if title.contains(event)[0]:
-                    title_pressed = title
-                    break
+            index = titles.hit(event)
             # title was pressed -> identify the IC
-            if title_pressed is not None:
-                label = title_pressed.get_text() # e.g. "ICA000 (eeg)"
-                ic = int(label.split(" ")[0][-3:])
+            if index is not None:
+                title_pressed = titles.titles[index]
+                ic = title_ics[index]
                 # add or remove IC from exclude depending on current state
                 if ic in ica.exclude:
                     if deselect:
@@ -294,13 +354,16 @@ def custome_ica_plot(
                         is_correct = (ic in ICA_remove_inds_list)
                         FeedbackWindow(master, is_correct)
 
-                fig.canvas.draw()
+                titles.redraw(index)
 
         fig.canvas.mpl_connect("button_press_event", onclick_title)
+        if not user_passed_axes:
+            # Nothing in our figure is pickable: skip matplotlib's pick pass over every artist on each click
+            fig.canvas.mpl_disconnect(fig.canvas.button_pick_id)
 
         # add plot_properties interactivity only if inst was passed
         #if isinstance(inst, BaseRaw | BaseEpochs):
-        if isinstance(inst,(BaseRaw, BaseEpochs)):
+        if isinstance(inst,(BaseRaw, BaseEpochs)) or callable(inst) or props is not None:
             topomap_args = dict(
                 sensors=sensors,
                 contours=contours,
@@ -321,8 +384,18 @@ def custome_ica_plot(
                     label = event.inaxes.get_label()
                     if label.startswith("ICA"):
                         ic = int(label.split(" ")[0][-3:])
-                        ica.plot_properties(
-                            inst,
+                        if props is not None:
+                            plot_ica_props(ica, props, ic, topo_grid=topo_grid, topomap_args=topomap_args)
+                            return
+                        data = inst() if callable(inst) else inst
+                        # Raw: only the clicked component's sources are computed,
+                        # read chunk-wise so the recording need not be preloaded
+                        if isinstance(data, BaseRaw):
+                            plot_properties = functools.partial(plot_raw_component_properties, ica)
+                        else:
+                            plot_properties = ica.plot_properties
+                        plot_properties(
+                            data,
                             picks=ic,
                             show=True,
                             plot_std=plot_std,
@@ -337,3 +410,175 @@ def custome_ica_plot(
 
     plt_show(show)
     return figs[0] if len(figs) == 1 else figs
+
+
+def plot_ica_props(ica, props, ic, topo_grid=None, topomap_args=None, show=True):
+    """
+    Component properties figure (same layout as ``ica.plot_properties``) drawn
+    from a precomputed bundle of ``ica_props.py``; no data are touched.
+    """
+    from scipy.stats import gaussian_kde
+    from mpl_toolkits.axes_grid1.axes_divider import make_axes_locatable
+    from mne.viz.ica import _create_properties_layout
+    from mne.viz.topomap import _plot_ica_topomap
+
+    fig, axes = _create_properties_layout()
+    topo_ax, image_ax, erp_ax, spec_ax, var_ax = axes
+    kind = str(props["kind"])
+
+    # topomap
+    if topo_grid is not None:
+        draw_topo(topo_ax, topo_grid, ic, cmap=(topomap_args or {}).get("cmap", "RdBu_r"))
+        topo_ax.set_title(ica._ica_names[ic])
+        _hide_frame(topo_ax)
+    else:
+        _plot_ica_topomap(ica, ic, show=False, axes=topo_ax, **(topomap_args or {}))
+
+    # segment image and mean time course
+    times, image = props["times"], props["image"][ic]
+    n_segments = len(image)
+    _vlim = _setup_vmin_vmax(image, None, None)
+    image_ax.imshow(
+        image, aspect="auto", origin="lower", cmap="RdBu_r", vmin=_vlim[0], vmax=_vlim[1],
+        extent=(times[0], times[-1], 0, n_segments), interpolation="nearest",
+    )
+    image_ax.set_title(f"{kind} image and ERP/ERF")
+    image_ax.set_ylabel(kind)
+    image_ax.set_xticks([])
+    image_ax.set_ylim([-0.5, n_segments + 0.5])
+    image_ax.tick_params("both", labelsize=8)
+    erp_ax.plot(times, props["erp_mean"][ic], color="k", lw=1)
+    erp_ax.fill_between(times, props["erp_ci"][0, ic], props["erp_ci"][1, ic], color="k", alpha=0.2, lw=0)
+    erp_ax.set_xlim(times[[0, -1]])
+    erp_ax.set_xlabel("Time (s)")
+    erp_ax.set_ylabel("AU")
+    erp_ax.tick_params("both", labelsize=8)
+
+    # spectrum
+    freqs, psd_mean, psd_std = props["freqs"], props["psd_mean"][ic], props["psd_std"][ic]
+    spec_ax.plot(freqs, psd_mean, color="k")
+    spec_ax.fill_between(freqs, psd_mean - psd_std[0], psd_mean + psd_std[1], color="k", alpha=0.2)
+    lowpass = float(props["lowpass"])
+    if lowpass < freqs[-1]:
+        spec_ax.axvline(lowpass, lw=2, linestyle="--", color="k", alpha=0.2)
+    spec_ax.set_xlim(freqs[[0, -1]])
+    spec_ax.set_title("Spectrum")
+    spec_ax.set_xlabel("Frequency (Hz)")
+    spec_ax.set_ylabel(str(props["psd_ylabel"]))
+    spec_ax.tick_params("both", labelsize=8)
+
+    # segment variance, dropped segments in red
+    segment_var, bad_indices = props["segment_var"][ic], props["bad_indices"]
+    good_indices = np.setdiff1d(np.arange(n_segments), bad_indices)
+    facecolor = np.zeros((n_segments, 3))
+    facecolor[bad_indices] = [1, 0, 0]
+    var_ax.scatter(np.arange(n_segments), segment_var, facecolor=facecolor, alpha=0.5, lw=0)
+    hist_ax = make_axes_locatable(var_ax).append_axes("right", size="33%", pad="2.5%", sharey=var_ax)
+    var_good = segment_var[good_indices]
+    hist_ax.hist(var_good, orientation="horizontal", color="k", alpha=0.5)
+    try:
+        kde = gaussian_kde(var_good)
+    except (np.linalg.LinAlgError, ValueError):
+        pass
+    else:
+        x = np.linspace(var_good.min(), var_good.max(), 50)
+        kde_ = kde(x)
+        kde_ *= hist_ax.get_xlim()[-1] * 0.9 / (kde_.max() or 1.)
+        hist_ax.plot(kde_, x, color="k")
+    hist_ax.set_yticks([])
+    var_ax.set_title(f"Dropped segments: {100 * len(bad_indices) / n_segments:.2f} %")
+    var_ax.set_xlabel(kind)
+    var_ax.set_ylabel("Variance (AU)")
+    var_ax.tick_params("both", labelsize=8)
+    hist_ax.tick_params("both", labelsize=8)
+
+    plt_show(show)
+    return [fig]
+
+
+def _component_source(ica, raw, ic, chunk_duration=60.):
+    """ Time course of component `ic` alone, read from `raw` chunk by chunk. """
+    return component_sources(ica, raw, [ic], chunk_duration)[0]
+
+
+def plot_raw_component_properties(
+    ica,
+    raw,
+    picks,
+    show=True,
+    plot_std=True,
+    topomap_args=None,
+    image_args=None,
+    psd_args=None,
+    reject="auto",
+    dB=True,
+):
+    """
+    Same figure as ``ica.plot_properties(raw, picks=ic)`` for one component, but
+    the sources of the other components are never computed and ``raw`` may be
+    opened without preload. Memory is one component's time course instead of
+    n_components x n_times.
+    """
+    from mne.viz.ica import _create_properties_layout, _plot_ica_properties, _get_psd_label_and_std
+
+    ic = int(np.atleast_1d(picks)[0])
+    num_std = float(plot_std)  # True -> 1 std
+    plot_std = bool(num_std)
+    topomap_args = dict() if topomap_args is None else topomap_args
+    image_args = dict() if image_args is None else dict(image_args)
+    psd_args = dict() if psd_args is None else dict(psd_args)
+    image_args["ts_args"] = dict(truncate_xaxis=False, show_sensors=False)
+    if plot_std:
+        from mne.stats.parametric import _parametric_ci
+        image_args["ts_args"]["ci"] = _parametric_ci
+    else:
+        image_args["ts_args"]["ci"] = False
+
+    # 2 s segments as in mne; rejection reads the recording segment by segment
+    if reject == "auto":
+        reject = ica.reject_
+    sfreq = raw.info["sfreq"]
+    events = mne.make_fixed_length_events(raw, duration=2)
+    kwargs = dict(tmin=0, tmax=2 - 1. / sfreq, baseline=None, verbose="error", proj=False)
+    epochs = mne.Epochs(raw, events, reject=reject, preload=False, **kwargs).drop_bad(verbose="error")
+    bad_indices = np.where([len(log) for log in epochs.drop_log])[0]
+    if len(bad_indices) == len(events):
+        raise RuntimeError(f"No clean 2-second segments found out of {len(events)} using {reject=}.")
+
+    info = mne.create_info([ica._ica_names[ic]], sfreq, "misc")
+    with info._unlock():
+        info["highpass"] = raw.info["highpass"]
+        info["lowpass"] = raw.info["lowpass"]
+    source = mne.io.RawArray(_component_source(ica, raw, ic)[None], info, first_samp=raw.first_samp, verbose=False)
+    epochs_src = mne.Epochs(source, events, reject=None, reject_by_annotation=False, preload=True, **kwargs)
+    good_indices = np.setdiff1d(np.arange(len(epochs_src)), bad_indices)
+
+    nyquist = sfreq / 2.
+    lowpass = epochs_src.info["lowpass"]
+    psd_args.setdefault("fmax", min(lowpass * 1.25, nyquist))
+    plot_lowpass_edge = lowpass < nyquist and psd_args["fmax"] > lowpass
+    spectrum = epochs_src[good_indices].compute_psd(picks="all", **psd_args)
+    psds, freqs = spectrum.get_data(return_freqs=True, picks="all", exclude=[])
+    psd_ylabel, psds_mean, spectrum_std = _get_psd_label_and_std(
+        psds[:, 0, :].copy(), dB, ica, num_std, estimate="power"
+    )
+
+    def set_title_and_labels(ax, title, xlab, ylab):
+        if title:
+            ax.set_title(title)
+        if xlab:
+            ax.set_xlabel(xlab)
+        if ylab:
+            ax.set_ylabel(ylab)
+        ax.axis("auto")
+        ax.tick_params("both", labelsize=8)
+        ax.axis("tight")
+
+    fig, axes = _create_properties_layout()
+    fig = _plot_ica_properties(
+        ic, ica, psds_mean, freqs, plot_lowpass_edge, epochs_src, set_title_and_labels,
+        plot_std, psd_ylabel, spectrum_std, False, topomap_args, image_args, fig, axes,
+        "Segment", bad_indices,
+    )
+    plt_show(show)
+    return [fig]
@@ -0,0 +1,168 @@
+# ica_props.py
+# Precomputed ICA component properties.
+# Next to each <name>_ica.fif, fit_and_save_ica writes <name>_ica_props.npz with what
+# ica.plot_properties shows for every component: the source spectrum (mean and
+# spread over 2 s segments), the variance of each segment, the segment image
+# (time-binned) and the mean time course with its confidence interval. The trainer
+# draws a clicked component from it (ica_plot.plot_ica_props) without touching
+# the recording.
+# e.g. python ica_props.py data/ica   (backfills bundles for existing ICA files)
+import os
+import sys
+import math
+import numpy as np
+
+PROPS_VERSION = 1
+
+
+def ica_props_path(ica_path):
+    return os.path.splitext(ica_path)[0] + '_props.npz'
+
+
+def component_sources(ica, raw, ics, chunk_duration=60.):
+    """ Time courses (len(ics), n_times) of components `ics` only, read from `raw` chunk by chunk. """
+    import mne
+    picks = ica._get_picks(raw)
+    weights = ica.unmixing_matrix_[ics] @ ica.pca_components_[:ica.n_components_]
+    chunk = max(1, int(chunk_duration * raw.info["sfreq"]))
+    sources = np.empty((len(ics), raw.n_times))
+    with mne.utils.use_log_level("warning"):
+        for start in range(0, raw.n_times, chunk):
+            stop = min(start + chunk, raw.n_times)
+            data = ica._pre_whiten(raw.get_data(picks, start, stop))
+            if ica.pca_mean_ is not None:
+                data -= ica.pca_mean_[:, None]
+            sources[:, start:stop] = weights @ data
+    return sources
+
+
+def compute_ica_props(ica, raw, reject="auto", image_samples=200, chunk_components=4):
+    """
+    Properties of all components of `ica` on `raw` (the data it was fitted on),
+    computed as in mne's plot_properties. The segment image is averaged into at
+    most `image_samples` time bins. Sources are computed `chunk_components` at a
+    time, so memory stays at a few components' time courses whatever the number
+    of components.
+    """
+    import mne
+    from mne.viz.ica import _get_psd_label_and_std
+    from mne.stats.parametric import _parametric_ci
+
+    # 2 s segments and their rejection as in mne; rejection reads the recording segment by segment
+    if reject == "auto":
+        reject = ica.reject_
+    sfreq = raw.info["sfreq"]
+    events = mne.make_fixed_length_events(raw, duration=2)
+    kwargs = dict(tmin=0, tmax=2 - 1. / sfreq, baseline=None, verbose="error", proj=False)
+    epochs = mne.Epochs(raw, events, reject=reject, preload=False, **kwargs).drop_bad(verbose="error")
+    bad_indices = np.where([len(log) for log in epochs.drop_log])[0]
+    if len(bad_indices) == len(events):
+        raise RuntimeError(f"No clean 2-second segments found out of {len(events)} using {reject=}.")
+    good_indices = np.setdiff1d(np.arange(len(events)), bad_indices)
+
+    nyquist = sfreq / 2.
+    lowpass = raw.info["lowpass"]
+    fmax = min(lowpass * 1.25, nyquist)
+    n_components = ica.n_components_
+    chunks = {}
+    for first in range(0, n_components, chunk_components):
+        ics = list(range(first, min(first + chunk_components, n_components)))
+        info = mne.create_info([ica._ica_names[ic] for ic in ics], sfreq, "misc")
+        with info._unlock():
+            info["highpass"] = raw.info["highpass"]
+            info["lowpass"] = lowpass
+        source = mne.io.RawArray(component_sources(ica, raw, ics), info, first_samp=raw.first_samp, verbose=False)
+        epochs_src = mne.Epochs(source, events, reject=None, reject_by_annotation=False, preload=True, **kwargs)
+        del source
+
+        spectrum = epochs_src[good_indices].compute_psd(picks="all", fmax=fmax, verbose="error")
+        psds, freqs = spectrum.get_data(return_freqs=True, picks="all", exclude=[])
+        psd_mean = np.empty((len(ics), len(freqs)))
+        psd_std = np.empty((len(ics), 2, len(freqs)))
+        for jj in range(len(ics)):
+            psd_ylabel, psd_mean[jj], psd_std[jj] = _get_psd_label_and_std(
+                psds[:, jj, :].copy(), True, ica, 1., estimate="power"
+            )
+
+        data = epochs_src.get_data(copy=False)  # (n_segments, len(ics), n_times)
+        segment_var = np.var(data, axis=-1).T
+        data[bad_indices] = 0  # shown as empty rows, as in mne
+        erp_ci = np.asarray(_parametric_ci(data))  # (2, len(ics), n_times)
+        erp_mean = data.mean(axis=0)
+        binning = max(1, math.ceil(data.shape[-1] / image_samples))
+        n_bins = data.shape[-1] // binning
+        image = data[..., :n_bins * binning].reshape(data.shape[:2] + (n_bins, binning)).mean(axis=-1)
+        times = epochs_src.times
+        del epochs_src, data
+
+        for key, value, axis in (
+            ("psd_mean", psd_mean, 0), ("psd_std", psd_std, 0), ("segment_var", segment_var, 0),
+            ("erp_mean", erp_mean, 0), ("erp_ci", erp_ci, 1),
+            ("image", image.transpose(1, 0, 2).astype(np.float32), 0),  # (n_components, n_segments, n_bins)
+        ):
+            chunks.setdefault(key, []).append((value, axis))
+
+    props = {key: np.concatenate([v for v, _ in parts], axis=parts[0][1]) for key, parts in chunks.items()}
+    props.update(
+        version=np.array(PROPS_VERSION),
+        kind=np.array("Segment"),
+        names=np.array(ica._ica_names),
+        freqs=freqs,
+        psd_ylabel=np.array(psd_ylabel),
+        lowpass=np.array(lowpass),
+        bad_indices=bad_indices.astype(int),
+        times=times,
+    )
+    return props
+
+
+def save_ica_props(ica, raw, ica_path, **kwargs):
+    """ Compute and write the bundle of the ICA saved at `ica_path`. Returns the bundle path. """
+    path = ica_props_path(ica_path)
+    tmp_path = path + f'.{os.getpid()}.tmp.npz'
+    np.savez_compressed(tmp_path, **compute_ica_props(ica, raw, **kwargs))
+    os.replace(tmp_path, path)
+    return path
+
+
+def load_ica_props(ica_path):
+    """
+    The bundle of `ica_path` as a dict of arrays, or None if it is missing, from
+    an older format, or older than the ICA file (then properties are computed live).
+    """
+    path = ica_props_path(ica_path)
+    try:
+        if os.path.getmtime(path) < os.path.getmtime(ica_path):
+            return None
+        with np.load(path) as npz:
+            props = {key: npz[key] for key in npz.files}
+    except (OSError, ValueError):
+        return None
+    if int(props.get("version", -1)) != PROPS_VERSION:
+        return None
+    return props
+
+
+def main(ica_dir, preprocessed_dir):
+    """ Write missing or outdated bundles for all *_ica.fif files under `ica_dir`. """
+    import mne
+    for root, _, files in os.walk(ica_dir):
+        for fname in sorted(files):
+            if not fname.endswith('_ica.fif'):
+                continue
+            ica_path = os.path.join(root, fname)
+            if load_ica_props(ica_path) is not None:
+                continue
+            subj, ses, run = fname.split('_')[:3]
+            raw_path = os.path.join(preprocessed_dir, f"{subj}_{ses}_{run}_preprocessed_raw.fif")
+            if not os.path.exists(raw_path):
+                print(f"[PROPS] {fname}: no {os.path.basename(raw_path)}, skipped")
+                continue
+            raw = mne.io.read_raw_fif(raw_path, preload=True, allow_maxshield=True, verbose=False)
+            save_ica_props(mne.preprocessing.read_ica(ica_path, verbose=False), raw, ica_path)
+            print(f"[PROPS] {fname} → {os.path.basename(ica_props_path(ica_path))}")
+
+
+if __name__ == "__main__":
+    import config
+    main(sys.argv[1] if len(sys.argv) > 1 else config.ica_dir, config.preprocessed_save_path)
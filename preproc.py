@@ -7,6 +7,15 @@ from preproc_funcs import (
     preprocess_and_make_trials
 )
 
+def snippet_offset_arg(value):
+    """ --snippet-offset is either a placement strategy or a start time in seconds. """
+    if value.lower() in ('random', 'spread'):
+        return value.lower()
+    try:
+        return float(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected 'random', 'spread' or seconds, got {value!r}")
+
 def main():
     parser = argparse.ArgumentParser(
         description="Script to preprocess MEEG data, optionally run ICA, and/or make trial snippets."
@@ -35,10 +44,14 @@ def main():
     parser.add_argument("--max-bad-ch", type=int, default=config.max_bad_ch, help="Max bad channels forced in snippet (default=3).")
     parser.add_argument("--min-bad-ch", type=int, default=config.min_bad_ch, help="Min bad channels forced in snippet (default=1).")
 
+    parser.add_argument("--snippet-length", type=float, default=config.snippet_length, help="Seconds of data kept per trial (default: whole recording).")
+    parser.add_argument("--snippet-offset", type=snippet_offset_arg, default=config.snippet_offset, help="Snippet start in seconds, or 'random' / 'spread' (default='random').")
+
     # ICA-related optional arguments
     parser.add_argument("--n-components", type=int, default=50, help="Number of ICA components (default=50).")
     parser.add_argument("--ica-method", type=str, default='fastica', help="ICA method (e.g. fastica, infomax).")
     parser.add_argument("--random-state", type=int, default=42, help="Random seed for ICA (default=42).")
+    parser.add_argument("--ica-concurrent", action="store_true", default=False, help="Fit the per-channel-type ICAs at the same time on the shared filtered data.")
 
     # Trial-related optional argument
     # "do_trial" can be triggered either by: "TRIAL" in commands or by passing --do-trial
@@ -49,6 +62,21 @@ def main():
         help="True: generate trials after Preprocessing. Can also be triggered by 'TRIAL' command."
     )
 
+    # Parallel processing
+    parser.add_argument("--jobs", type=int, default=1, help="Number of raw files processed in parallel (default=1).")
+    parser.add_argument("--blas-threads", type=int, default=None, help="BLAS threads per worker when --jobs > 1 (default=cores // jobs).")
+
+    # Filtering
+    parser.add_argument("--filter-plan", action="store_true", default=False, help="Apply notch, high-pass and low-pass as one combined FIR kernel in a single pass.")
+    parser.add_argument("--compare-filter", action="store_true", default=False, help="Also run the three-pass filters and report speedup and max deviation per file.")
+
+    parser.add_argument("--stream", action="store_true", default=False, help="Out-of-core mode: filter in chunks without loading the whole recording.")
+    parser.add_argument("--chunk-duration", type=float, default=config.stream_chunk_duration, help=f"Seconds per chunk in --stream mode (default={config.stream_chunk_duration:g}).")
+
+    # Filtered-recording cache
+    parser.add_argument("--cache-dir", type=str, default=config.cache_dir, help=f"Cache of filtered recordings (default={config.cache_dir}).")
+    parser.add_argument("--no-cache", action="store_true", default=False, help="Always re-read and re-filter the raw files.")
+
     args = parser.parse_args()
     commands_lower = [cmd.lower() for cmd in args.commands]
 
@@ -103,7 +131,17 @@ def main():
             min_bad_channels=args.min_bad_ch,
             n_components=args.n_components,
             ica_method=args.ica_method,
-            random_state=args.random_state
+            random_state=args.random_state,
+            n_jobs=args.jobs,
+            blas_threads=args.blas_threads,
+            cache_dir=None if args.no_cache else args.cache_dir,
+            filter_plan=args.filter_plan,
+            compare_filter=args.compare_filter,
+            ica_concurrent=args.ica_concurrent,
+            snippet_length=args.snippet_length,
+            snippet_offset=args.snippet_offset,
+            stream=args.stream,
+            stream_chunk_duration=args.chunk_duration
         )
 
 if __name__ == "__main__":
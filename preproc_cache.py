@@ -0,0 +1,174 @@
+# preproc_cache.py
+# Content-addressed cache of filtered recordings.
+# Key = sha256(input file content) + filter parameters, so re-running preproc.py
+# with different trial/ICA settings reuses the filtered data instead of re-reading
+# and re-filtering the raw file.
+#
+# Layout of cache_dir:
+#   <key>_raw.fif          filtered recording
+#   <key>_filtered.npy/.json  filtered recording written by streaming mode
+#   <key>.json             manifest entry: source, parameters, and what was produced from it
+#   hashes/<file>.json     memo of the source hash, reused while size & mtime are unchanged
+import os
+import json
+import hashlib
+import mne
+
+CACHE_VERSION = 1
+_HASH_CHUNK = 16 * 1024 * 1024
+
+
+def _write_json_atomic(path, obj):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(obj, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def _read_json(path):
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def file_sha256(file_path, cache_dir=None):
+    """
+    sha256 of the file content. If `cache_dir` is given, the digest is memoized
+    and only recomputed when the file's size or mtime changed. Memos are per
+    absolute path: same-named copies in other directories never share one.
+    """
+    st = os.stat(file_path)
+    abs_path = os.path.abspath(file_path)
+    memo_path = None
+    if cache_dir is not None:
+        memo_dir = os.path.join(cache_dir, 'hashes')
+        os.makedirs(memo_dir, exist_ok=True)
+        path_id = hashlib.sha256(abs_path.encode('utf-8')).hexdigest()[:16]
+        memo_path = os.path.join(memo_dir, f"{os.path.basename(file_path)}.{path_id}.json")
+        memo = _read_json(memo_path)
+        if (memo and memo.get("path") == abs_path
+                and memo.get("size") == st.st_size and memo.get("mtime_ns") == st.st_mtime_ns):
+            return memo["sha256"]
+
+    h = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK), b''):
+            h.update(chunk)
+    digest = h.hexdigest()
+
+    if memo_path is not None:
+        _write_json_atomic(memo_path, {
+            "path": abs_path,
+            "size": st.st_size,
+            "mtime_ns": st.st_mtime_ns,
+            "sha256": digest,
+        })
+    return digest
+
+
+def cache_key(source_sha256, filter_params):
+    """ Key of a filtered recording: source content + filter parameters. """
+    payload = json.dumps(
+        {"source": source_sha256, "params": filter_params, "version": CACHE_VERSION},
+        sort_keys=True
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()[:32]
+
+
+def cached_fif_path(cache_dir, key):
+    return os.path.join(cache_dir, f"{key}_raw.fif")
+
+
+def read_entry(cache_dir, key):
+    return _read_json(os.path.join(cache_dir, f"{key}.json"))
+
+
+def get_filtered_raw(file_path, filter_params, filter_func, cache_dir):
+    """
+    Return (raw, key): the filtered recording for `file_path`, loaded from the
+    cache when an entry for the same content and `filter_params` exists,
+    otherwise computed with `filter_func(file_path)` and stored.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    source_sha256 = file_sha256(file_path, cache_dir=cache_dir)
+    key = cache_key(source_sha256, filter_params)
+    fif_path = cached_fif_path(cache_dir, key)
+
+    entry = read_entry(cache_dir, key)
+    if entry is not None and os.path.exists(fif_path):
+        print(f"[CACHE] hit {key} for {os.path.basename(file_path)}")
+        raw = mne.io.read_raw_fif(fif_path, preload=True, allow_maxshield=True)
+        return raw, key
+
+    print(f"[CACHE] miss {key} for {os.path.basename(file_path)}, filtering ...")
+    raw = filter_func(file_path)
+    raw.save(fif_path, overwrite=True)
+    # The entry is written after the data, so an entry always points to a complete file
+    _write_json_atomic(os.path.join(cache_dir, f"{key}.json"), {
+        "key": key,
+        "source": os.path.abspath(file_path),
+        "source_sha256": source_sha256,
+        "params": filter_params,
+        "filtered": os.path.basename(fif_path),
+        "products": {},
+    })
+    return raw, key
+
+
+def get_streamed_recording(file_path, filter_params, stream_func, cache_dir):
+    """
+    Streaming-mode counterpart of `get_filtered_raw`: returns (header_path, key)
+    of the float32 sidecar for `file_path`, creating it with
+    `stream_func(file_path, out_base)` on a cache miss.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    source_sha256 = file_sha256(file_path, cache_dir=cache_dir)
+    key = cache_key(source_sha256, filter_params)
+    out_base = os.path.join(cache_dir, f"{key}_filtered")
+    header_path = out_base + '.json'
+
+    entry = read_entry(cache_dir, key)
+    if entry is not None and os.path.exists(header_path):
+        print(f"[CACHE] hit {key} for {os.path.basename(file_path)}")
+        return header_path, key
+
+    print(f"[CACHE] miss {key} for {os.path.basename(file_path)}, filtering ...")
+    header_path = stream_func(file_path, out_base)
+    _write_json_atomic(os.path.join(cache_dir, f"{key}.json"), {
+        "key": key,
+        "source": os.path.abspath(file_path),
+        "source_sha256": source_sha256,
+        "params": filter_params,
+        "filtered": os.path.basename(header_path),
+        "products": {},
+    })
+    return header_path, key
+
+
+def record_products(cache_dir, key, kind, paths):
+    """ Add output files (trials, ICA, preprocessed raw, ...) to the manifest entry of `key`. """
+    entry_path = os.path.join(cache_dir, f"{key}.json")
+    entry = _read_json(entry_path)
+    if entry is None:
+        return
+    products = entry.setdefault("products", {})
+    known = products.setdefault(kind, [])
+    for path in paths:
+        if path not in known:
+            known.append(path)
+    _write_json_atomic(entry_path, entry)
+
+
+def read_manifest(cache_dir):
+    """ All manifest entries in `cache_dir`, keyed by cache key. """
+    manifest = {}
+    if not os.path.isdir(cache_dir):
+        return manifest
+    for fname in sorted(os.listdir(cache_dir)):
+        if fname.endswith('.json'):
+            entry = _read_json(os.path.join(cache_dir, fname))
+            if entry and "key" in entry:
+                manifest[entry["key"]] = entry
+    return manifest
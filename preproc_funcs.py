@@ -1,11 +1,23 @@
 # preproc_funcs.py
 # functions used for preprocessing
 import os
+import io
 import mne
-import json
+import numpy as np
+import time
 import random
-import pickle
+import contextlib
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
 import config
+from trial_io import save_trial
+from answer_key import load_answer_key
+from preproc_cache import get_filtered_raw, get_streamed_recording, record_products
+from filter_plan import apply_filter_plan, three_pass_filter, compare_filter_plan
+from stream_preproc import stream_filter_recording, open_streamed_recording, decimated_raw
+from topo_grid import save_topo_grid
+from ica_props import save_ica_props
+from trial_catalog import connect, add_rows, trial_row, ica_row
 
 # -------------------------------
 #           ICA
@@ -17,23 +29,210 @@ def fit_and_save_ica(
     channel_type,
     n_components=config.ica_components, 
     method=config.ica_method, 
-    random_state=config.ica_seed
+    random_state=config.ica_seed,
+    catalog_path=config.trial_catalog,
+    precompute=True
 ):
+    """
+    Fit, save and catalog the ICA of one channel type. With `precompute`, the
+    topomap grid and component properties for the trainer are saved next to it;
+    if one cannot be computed (e.g. no sensor positions) a warning is printed and
+    the trainer computes it live, as for ICAs saved without them.
+    """
     ica = mne.preprocessing.ICA(
         n_components=n_components, 
         method=method, 
         random_state=random_state
     )
+    t0 = time.perf_counter()
     ica.fit(raw, picks=channel_type)
+    print(f"[ICA] {channel_type} fitted in {time.perf_counter() - t0:.1f}s")
     ica_ch_save_path = os.path.join(ica_save_path,channel_type)
     os.makedirs(ica_ch_save_path, exist_ok=True)
-    ica.save(os.path.join(ica_ch_save_path,ica_name), overwrite=True)
-    print(f"[ICA] {channel_type} → saved to {os.path.join(ica_ch_save_path,ica_name)}")
+    ica_path = os.path.join(ica_ch_save_path, ica_name)
+    ica.save(ica_path, overwrite=True)
+    print(f"[ICA] {channel_type} → saved to {ica_path}")
+    # Topomaps and component properties for the trainer, so ICA trials don't compute them live
+    if precompute:
+        try:
+            save_topo_grid(ica, ica_path)
+        except Exception as e:
+            print(f"[WARNING] {channel_type} topomap grid not precomputed ({type(e).__name__}: {e}); the trainer draws it live")
+        try:
+            save_ica_props(ica, raw, ica_path)
+        except Exception as e:
+            print(f"[WARNING] {channel_type} component properties not precomputed ({type(e).__name__}: {e}); the trainer computes them live")
+    if catalog_path:
+        add_rows([ica_row(ica_path, ica_save_path, channel_type, ica.n_components_)], catalog_path)
+    return ica_path
+
+
+def fit_and_save_icas_concurrently(
+    raw,
+    ica_save_path,
+    ica_names,
+    n_components=config.ica_components,
+    method=config.ica_method,
+    random_state=config.ica_seed,
+    n_threads=None,
+    catalog_path=config.trial_catalog,
+    precompute=True
+):
+    """
+    Fit one ICA per channel type at the same time, in threads of this process,
+    so all fits read the same filtered `raw` instead of a copy each.
+    The BLAS pool is split between the fits (`n_threads` total, default all cores)
+    so they don't oversubscribe the machine.
+
+    Args:
+        ica_names (dict): channel_type -> ICA file name.
+
+    Returns:
+        dict: channel_type -> (saved path, fit+save seconds)
+    """
+    channel_types = list(ica_names)
+    if n_threads is None:
+        n_threads = os.cpu_count() or 1
+    threads_per_fit = max(1, n_threads // len(channel_types))
+
+    def _fit(ch_type):
+        t0 = time.perf_counter()
+        path = fit_and_save_ica(
+            raw=raw,
+            ica_save_path=ica_save_path,
+            ica_name=ica_names[ch_type],
+            channel_type=ch_type,
+            n_components=n_components,
+            method=method,
+            random_state=random_state,
+            catalog_path=catalog_path,
+            precompute=precompute
+        )
+        return path, time.perf_counter() - t0
+
+    try:
+        from threadpoolctl import threadpool_limits
+        limiter = threadpool_limits(limits=threads_per_fit)
+    except ImportError:
+        limiter = contextlib.nullcontext()
+
+    print(f"[ICA] Fitting {channel_types} concurrently ({threads_per_fit} BLAS thread(s) each)")
+    with limiter, ThreadPoolExecutor(max_workers=len(channel_types)) as executor:
+        futures = {ch_type: executor.submit(_fit, ch_type) for ch_type in channel_types}
+        return {ch_type: future.result() for ch_type, future in futures.items()}
+
+
+# -------------------------------
+#        LOAD & FILTER
+# -------------------------------
+def load_and_filter(file_path, l_freq=0.1, h_freq=80, notch_freq=50, filter_plan=False, compare_filter=False):
+    """
+    Read a raw recording and apply the notch, high-pass and low-pass filters.
+    With `filter_plan` the three filters are applied as one combined kernel
+    (see filter_plan.py); `compare_filter` also runs the three-pass chain and
+    reports the speedup and maximum deviation.
+    """
+    raw = mne.io.read_raw(file_path, preload=True, allow_maxshield=True)
+    if compare_filter:
+        compare_filter_plan(raw, l_freq, h_freq, notch_freq)
+    if filter_plan:
+        apply_filter_plan(raw, l_freq, h_freq, notch_freq)
+    else:
+        three_pass_filter(raw, l_freq, h_freq, notch_freq)
+    return raw
 
 
 # -------------------------------
 #     SELECT AND SHUFFLE 
 # -------------------------------
+def channel_type_indices(ch_names):
+    """
+    Indices of the 'eeg', 'mag' and 'grad' channels in `ch_names`, computed once
+    per recording (EEGxxx / MEGxxx1 / MEGxxx2, MEGxxx3 naming).
+    """
+    names = np.asarray(ch_names, dtype=str)
+    is_eeg = np.char.startswith(names, 'EEG')
+    is_meg = np.char.startswith(names, 'MEG')
+    is_mag = is_meg & np.char.endswith(names, '1')
+    is_grad = is_meg & (np.char.endswith(names, '2') | np.char.endswith(names, '3'))
+    return {
+        'eeg': np.flatnonzero(is_eeg),
+        'mag': np.flatnonzero(is_mag),
+        'grad': np.flatnonzero(is_grad),
+    }
+
+
+def _random_subsets(rng, n_rows, pool, n_pick):
+    """ Row-wise random subsets (without replacement) of `pool`, shape (n_rows, n_pick). """
+    if n_pick == 0 or len(pool) == 0:
+        return np.empty((n_rows, 0), dtype=int)
+    order = np.argsort(rng.random((n_rows, len(pool))), axis=1)[:, :n_pick]
+    return pool[order]
+
+
+def select_channels_batch(
+    ch_names,
+    bad_channels,
+    channel_type,
+    n_trials,
+    total_channels=15,
+    max_bad_channels=3,
+    min_bad_channels=1,
+    type_indices=None,
+    rng=None
+):
+    """
+    Draw the channels of `n_trials` trials at once.
+
+    Same rules as select_and_shuffle_channels: per trial, randint(min, max) bad
+    channels (capped by what the recording has), good channels for the rest,
+    shuffled together.
+
+    Returns:
+        picks (ndarray, int, (n_trials, total_channels)): channel indices into
+            `ch_names` in display order, padded with -1 if the type has too few channels.
+        is_bad (ndarray, bool, same shape): which picks are bad channels.
+    """
+    if rng is None:
+        rng = np.random.default_rng()
+    if type_indices is None:
+        type_indices = channel_type_indices(ch_names)
+    type_idx = type_indices.get(channel_type, np.empty(0, dtype=int))
+
+    # Good/bad split once per recording instead of per trial
+    bad_mask = np.isin(np.asarray(ch_names, dtype=str)[type_idx], list(bad_channels))
+    good_pool, bad_pool = type_idx[~bad_mask], type_idx[bad_mask]
+
+    num_bad = np.minimum(rng.integers(min_bad_channels, max_bad_channels + 1, size=n_trials), len(bad_pool))
+    num_good = np.minimum(total_channels - num_bad, len(good_pool))
+
+    bad_pick = _random_subsets(rng, n_trials, bad_pool, int(num_bad.max(initial=0)))
+    good_pick = _random_subsets(rng, n_trials, good_pool, int(num_good.max(initial=0)))
+    picks = np.concatenate([good_pick, bad_pick], axis=1)
+    valid = np.concatenate([
+        np.arange(good_pick.shape[1]) < num_good[:, None],
+        np.arange(bad_pick.shape[1]) < num_bad[:, None],
+    ], axis=1)
+    is_bad = np.concatenate([
+        np.zeros(good_pick.shape, dtype=bool),
+        np.ones(bad_pick.shape, dtype=bool),
+    ], axis=1)
+
+    # Shuffle each row; unused slots sort to the end and are cut or padded with -1
+    keys = np.where(valid, rng.random(picks.shape), np.inf)
+    order = np.argsort(keys, axis=1)[:, :total_channels]
+    picks = np.take_along_axis(picks, order, axis=1)
+    is_bad = np.take_along_axis(is_bad, order, axis=1)
+    valid = np.take_along_axis(valid, order, axis=1)
+    picks[~valid] = -1
+    is_bad &= valid
+    if picks.shape[1] < total_channels:
+        pad = total_channels - picks.shape[1]
+        picks = np.pad(picks, ((0, 0), (0, pad)), constant_values=-1)
+        is_bad = np.pad(is_bad, ((0, 0), (0, pad)), constant_values=False)
+    return picks, is_bad
+
+
 def select_and_shuffle_channels(
     raw, 
     bad_channels, 
@@ -42,35 +241,360 @@ def select_and_shuffle_channels(
     max_bad_channels=3, 
     min_bad_channels=1
 ):
-    all_channels = raw.ch_names
-    
-    # Filter channels by type
-    if channel_type == 'eeg':
-        type_channels = [ch for ch in all_channels if ch.startswith('EEG')]
-    elif channel_type == 'mag':
-        type_channels = [ch for ch in all_channels if ch.startswith('MEG') and ch.endswith('1')]
-    elif channel_type == 'grad':
-        type_channels = [ch for ch in all_channels if ch.startswith('MEG') and ch.endswith(('2', '3'))]
+    """ Single-trial version of select_channels_batch, returning channel names. """
+    picks, is_bad = select_channels_batch(
+        raw.ch_names,
+        bad_channels,
+        channel_type,
+        n_trials=1,
+        total_channels=total_channels,
+        max_bad_channels=max_bad_channels,
+        min_bad_channels=min_bad_channels
+    )
+    picks, is_bad = picks[0], is_bad[0]
+    selected_channels = [raw.ch_names[i] for i in picks[picks >= 0]]
+    selected_bad_channels = [raw.ch_names[i] for i in picks[is_bad]]
+    return selected_channels, selected_bad_channels
+
+
+# -------------------------------
+#     PARALLEL WORKER SETUP
+# -------------------------------
+_BLAS_THREAD_VARS = (
+    "OMP_NUM_THREADS",
+    "OPENBLAS_NUM_THREADS",
+    "MKL_NUM_THREADS",
+    "VECLIB_MAXIMUM_THREADS",
+    "NUMEXPR_NUM_THREADS",
+)
+
+
+def _init_worker(blas_threads):
+    """
+    Runs once in every pool process: cap the BLAS/OpenMP pools so that
+    N workers don't each spin up one thread per core, reseed `random`
+    so forked workers don't draw identical channel selections, and quiet
+    MNE so the per-file logs stay readable.
+    """
+    for var in _BLAS_THREAD_VARS:
+        os.environ[var] = str(blas_threads)
+    try:
+        # Env vars only help if BLAS wasn't loaded yet (fork); threadpoolctl
+        # also limits the already-initialised pools.
+        from threadpoolctl import threadpool_limits
+        threadpool_limits(limits=blas_threads)
+    except ImportError:
+        pass
+    random.seed()
+    mne.set_log_level('WARNING')
+
+
+# -------------------------------
+#        SNIPPET WINDOW
+# -------------------------------
+def choose_snippet_window(
+    n_times,
+    sfreq,
+    snippet_length=None,
+    snippet_offset='random',
+    trial_num=0,
+    n_trials=1
+):
+    """
+    Pick the [start, stop) sample window a trial keeps from the recording.
+
+    Args:
+        snippet_length (float | None): Seconds per trial. None keeps the whole recording.
+        snippet_offset (float | str): Start time in seconds, or a placement strategy:
+            'random' - uniformly random start for every trial
+            'spread' - trials of a file spread evenly over the recording
+
+    Returns:
+        (int, int): start and stop sample.
+    """
+    if snippet_length is None:
+        return 0, n_times
+    n_snippet = min(n_times, max(1, int(round(snippet_length * sfreq))))
+    last_start = n_times - n_snippet
+
+    if snippet_offset == 'random':
+        start = random.randint(0, last_start)
+    elif snippet_offset == 'spread':
+        start = int(round(last_start * trial_num / max(1, n_trials - 1)))
     else:
-        type_channels = []
-    
-    # Separate good/bad
-    good_channels = [ch for ch in type_channels if ch not in bad_channels]
-    bad_channels_in_type = [ch for ch in bad_channels if ch in type_channels]
+        start = min(max(0, int(round(float(snippet_offset) * sfreq))), last_start)
+    return start, start + n_snippet
 
-    # Randomly select bad channels
-    num_bad = min(random.randint(min_bad_channels, max_bad_channels), len(bad_channels_in_type))
-    selected_bad_channels = random.sample(bad_channels_in_type, num_bad) if num_bad > 0 else []
 
-    # Randomly select good channels
-    num_good = total_channels - num_bad
-    selected_good_channels = random.sample(good_channels, min(num_good, len(good_channels)))
+# -------------------------------
+#   PREPROCESS ONE RAW RECORDING
+# -------------------------------
+def process_data_file(
+    file_path,
+    trials_dir,
+    channel_types,
+    answer_path,
+    l_freq=0.1,
+    h_freq=80,
+    notch_freq=50,
+    n_versions=3,
+    trials_per_file=5,
+    total_channels=15,
+    max_bad_channels=3,
+    min_bad_channels=1,
+    do_ica=False,
+    do_trial=True,
+    ica_dir=config.ica_dir,
+    n_components=config.ica_components,
+    ica_method='fastica',
+    random_state=42,
+    cache_dir=config.cache_dir,
+    filter_plan=False,
+    compare_filter=False,
+    ica_concurrent=False,
+    ica_threads=None,
+    snippet_length=config.snippet_length,
+    snippet_offset=config.snippet_offset,
+    stream=False,
+    stream_chunk_duration=config.stream_chunk_duration,
+    catalog_path=config.trial_catalog
+):
+    """
+    Load, filter and (optionally) ICA / trial-split a single raw file.
+    With `stream` the file is filtered out-of-core (see stream_preproc.py).
+    Returns a small dict with what was produced, used for the final summary.
+    """
+    data_file = os.path.basename(file_path)
+    result = {"file": data_file, "n_trials": 0, "n_ica": 0}
 
-    # Combine and shuffle
-    selected_channels = selected_good_channels + selected_bad_channels
-    random.shuffle(selected_channels)
+    # Try to parse out subj_ses_run from the filename
+    # Assumed convention subj_ses_run_whatever.as_long_as_mne_likes_it
+    try:
+        subj, ses, run = data_file.split('_')[:3]
+    except ValueError:
+        print(f"File name {data_file} not in expected subj_ses_run format. Skipping.")
+        result["status"] = "skipped"
+        return result
 
-    return selected_channels, selected_bad_channels
+    print(f"\n--- Processing File: {data_file} (subj={subj}, ses={ses}, run={run}) ---")
+
+    # -------------------------
+    # 1) Load & Filter
+    # -------------------------
+    # With the cache on, a recording already filtered with the same
+    # parameters is read back instead of being re-filtered
+    def _filter(path):
+        return load_and_filter(
+            path, l_freq=l_freq, h_freq=h_freq, notch_freq=notch_freq,
+            filter_plan=filter_plan, compare_filter=compare_filter
+        )
+
+    # In streaming mode `raw` is opened without preload and only provides
+    # info/channel names; the filtered samples live in the memory-mapped `source`
+    def _stream(path, out_base):
+        return stream_filter_recording(
+            path, out_base, l_freq=l_freq, h_freq=h_freq, notch_freq=notch_freq,
+            chunk_duration=stream_chunk_duration
+        )
+
+    cache_key = None
+    source = None
+    filter_params = {
+        "l_freq": l_freq, "h_freq": h_freq, "notch_freq": notch_freq,
+        "method": "stream" if stream else ("plan" if filter_plan else "three-pass")
+    }
+    if stream:
+        if cache_dir:
+            header_path, cache_key = get_streamed_recording(file_path, filter_params, _stream, cache_dir)
+        else:
+            os.makedirs(config.preprocessed_save_path, exist_ok=True)
+            header_path = _stream(file_path, os.path.join(
+                config.preprocessed_save_path, f"{subj}_{ses}_{run}_filtered"
+            ))
+        raw, source = open_streamed_recording(file_path, header_path)
+    elif cache_dir:
+        raw, cache_key = get_filtered_raw(file_path, filter_params, _filter, cache_dir)
+    else:
+        raw = _filter(file_path)
+
+    # -------------------------
+    # 2) ICA (optional)
+    # -------------------------
+    if do_ica and channel_types:
+        print("[INFO] Running ICA ...")
+        ica_raw = raw
+        if source is not None:
+            # ICA needs the samples in memory: fit on a time-decimated copy
+            ica_raw = decimated_raw(raw, source, h_freq, chunk_duration=stream_chunk_duration)
+        ica_names = {
+            ch_type: f"{subj}_{ses}_{run}_{ch_type}_ica.fif"
+            for ch_type in channel_types if ch_type
+        }
+        if ica_concurrent and len(ica_names) > 1:
+            ica_results = fit_and_save_icas_concurrently(
+                raw=ica_raw,
+                ica_save_path=ica_dir,
+                ica_names=ica_names,
+                n_components=n_components,
+                method=ica_method,
+                random_state=random_state,
+                n_threads=ica_threads,
+                catalog_path=catalog_path
+            )
+        else:
+            ica_results = {}
+            for ch_type, ica_name in ica_names.items():
+                t0 = time.perf_counter()
+                ica_path = fit_and_save_ica(
+                    raw=ica_raw,
+                    ica_save_path=ica_dir,
+                    ica_name=ica_name,
+                    channel_type=ch_type,
+                    n_components=n_components,
+                    method=ica_method,
+                    random_state=random_state,
+                    catalog_path=catalog_path
+                )
+                ica_results[ch_type] = (ica_path, time.perf_counter() - t0)
+
+        result["n_ica"] = len(ica_results)
+        result["ica_seconds"] = {ch_type: sec for ch_type, (_, sec) in ica_results.items()}
+        print("[ICA] Fit times: " + ", ".join(f"{ch_type}={sec:.1f}s" for ch_type, sec in result["ica_seconds"].items()))
+        if cache_key:
+            record_products(cache_dir, cache_key, "ica", [path for path, _ in ica_results.values()])
+        # Force save preprocessed raw files in .fif format for ICA plot_properties
+        preprocessed_filename = f"{subj}_{ses}_{run}_preprocessed_raw.fif"
+        os.makedirs(config.preprocessed_save_path, exist_ok=True)
+        preprocessed_save_path = os.path.join(config.preprocessed_save_path, preprocessed_filename)
+
+        ica_raw.save(preprocessed_save_path, overwrite=True)
+        print(f"Preprocessed raw saved at: {preprocessed_save_path}")
+        if cache_key:
+            record_products(cache_dir, cache_key, "preprocessed", [preprocessed_save_path])
+    # -------------------------
+    # 3) Trials (optional)
+    # -------------------------
+    if not do_trial:
+        # If user doesn't want trials, skip
+        result["status"] = "ok"
+        return result
+
+    print("[INFO] Generating Trials ...")
+    answer_key = load_answer_key(answer_path)
+    trial_num = 0
+    trial_paths = []
+    catalog_rows = []
+    n_trials = n_versions * len(channel_types) * trials_per_file
+
+    # All channel selections of this file, drawn at once per channel type:
+    # row `version * trials_per_file + i` is the i-th trial of that version
+    rng = np.random.default_rng()
+    type_indices = channel_type_indices(raw.ch_names)
+    selections = {
+        ch_type: select_channels_batch(
+            raw.ch_names,
+            answer_key.bad_channels(subj, ses, run, ch_type),
+            ch_type,
+            n_trials=n_versions * trials_per_file,
+            total_channels=total_channels,
+            max_bad_channels=max_bad_channels,
+            min_bad_channels=min_bad_channels,
+            type_indices=type_indices,
+            rng=rng
+        )
+        for ch_type in channel_types
+    }
+
+    for version in range(n_versions):
+        for ch_type in channel_types:
+            ch_out_dir = os.path.join(trials_dir, ch_type)
+            os.makedirs(ch_out_dir, exist_ok=True)
+            picks, is_bad = selections[ch_type]
+
+            for i in range(trials_per_file):
+                row = version * trials_per_file + i
+                chs_to_display = picks[row][picks[row] >= 0]
+                bad_chans_in_display = [raw.ch_names[k] for k in picks[row][is_bad[row]]]
+                start, stop = choose_snippet_window(
+                    raw.n_times,
+                    raw.info['sfreq'],
+                    snippet_length=snippet_length,
+                    snippet_offset=snippet_offset,
+                    trial_num=trial_num,
+                    n_trials=n_trials
+                )
+                trial_name = f"{subj}_{ses}_{run}_trial_{trial_num}_{version+1}_{ch_type}"
+                trial_path = save_trial(
+                    raw,
+                    os.path.join(ch_out_dir, trial_name),
+                    chs_to_display,
+                    bad_chans_in_display,
+                    ch_type,
+                    start=start,
+                    stop=stop,
+                    meta={"subj": subj, "ses": ses, "run": run, "version": version + 1},
+                    source=source
+                )
+
+                print(f" -> Saved: {trial_name} | bad={bad_chans_in_display}")
+                trial_paths.append(trial_path)
+                catalog_rows.append(trial_row(trial_path, trials_dir))
+                trial_num += 1
+
+    if catalog_path:
+        add_rows(catalog_rows, catalog_path)
+    if cache_key:
+        record_products(cache_dir, cache_key, "trials", trial_paths)
+    result["n_trials"] = trial_num
+    result["status"] = "ok"
+    return result
+
+
+def _run_data_file(file_path, capture_output, kwargs):
+    """
+    Fail-soft wrapper around `process_data_file`: a corrupt recording is
+    reported as 'failed' instead of killing the batch. With `capture_output`
+    the file's progress prints are buffered so parallel workers don't
+    interleave, and the parent prints them as one block.
+    """
+    log = io.StringIO()
+    t0 = time.perf_counter()
+    try:
+        if capture_output:
+            with contextlib.redirect_stdout(log):
+                result = process_data_file(file_path, **kwargs)
+        else:
+            result = process_data_file(file_path, **kwargs)
+    except Exception as e:
+        result = {
+            "file": os.path.basename(file_path),
+            "status": "failed",
+            "error": f"{type(e).__name__}: {e}",
+            "n_trials": 0,
+            "n_ica": 0,
+        }
+    result["seconds"] = time.perf_counter() - t0
+    result["log"] = log.getvalue()
+    return result
+
+
+def print_summary(results, wall_time):
+    """ One summary block for the whole batch. """
+    n_ok = sum(r["status"] == "ok" for r in results)
+    failed = [r for r in results if r["status"] == "failed"]
+    skipped = [r for r in results if r["status"] == "skipped"]
+    print("\n=== Summary ===")
+    print(f"Files: {len(results)} | ok={n_ok} | skipped={len(skipped)} | failed={len(failed)}")
+    print(f"Trials written: {sum(r['n_trials'] for r in results)} | ICAs saved: {sum(r['n_ica'] for r in results)}")
+    print(f"Wall time: {wall_time:.1f}s | summed per-file time: {sum(r['seconds'] for r in results):.1f}s")
+    ica_totals = {}
+    for r in results:
+        for ch_type, sec in r.get("ica_seconds", {}).items():
+            ica_totals[ch_type] = ica_totals.get(ch_type, 0.) + sec
+    if ica_totals:
+        print("ICA fit time per type: " + ", ".join(f"{ch_type}={sec:.1f}s" for ch_type, sec in ica_totals.items()))
+    for r in failed:
+        print(f" [FAILED] {r['file']}: {r['error']}")
 
 
 # -------------------------------
@@ -93,13 +617,35 @@ def preprocess_and_make_trials(
     ica_dir=config.ica_dir,
     n_components=config.ica_components,
     ica_method='fastica',
-    random_state=42
+    random_state=42,
+    n_jobs=1,
+    blas_threads=None,
+    cache_dir=config.cache_dir,
+    filter_plan=False,
+    compare_filter=False,
+    ica_concurrent=False,
+    snippet_length=config.snippet_length,
+    snippet_offset=config.snippet_offset,
+    stream=False,
+    stream_chunk_duration=config.stream_chunk_duration,
+    catalog_path=config.trial_catalog,
+    answer_path=config.answer_file
 ):
+    """
+    Preprocess every file in `data_dir`. With n_jobs > 1 the files are spread
+    over a process pool; each worker's BLAS is capped to `blas_threads`
+    (default: cores // n_jobs). Failures are collected and reported at the end.
+    Filtered recordings are cached in `cache_dir` (None disables the cache).
+    Written trials and ICAs are indexed in the trial catalog at `catalog_path`.
+    Trials take their answers from `answer_path`, which must exist when do_trial is set.
+    """
 
-    print(f"\n=== Preprocessing for {channel_types} | do_ica={do_ica} | do_trial={do_trial} ===")
+    print(f"\n=== Preprocessing for {channel_types} | do_ica={do_ica} | do_trial={do_trial} | jobs={n_jobs} ===")
 
-    with open('answer_standardized.json', 'r') as file:
-        answer_data = json.load(file)
+    # Compile (or refresh) the answer index once here; workers then load the pickled copy.
+    # Trials without their answers would be useless, so a missing answer file stops here.
+    if do_trial:
+        load_answer_key(answer_path)
 
     data_files = [
         f for f in os.listdir(data_dir) 
@@ -109,104 +655,81 @@ def preprocess_and_make_trials(
         print(f"No files found in {data_dir}. Skipping.")
         return
 
-    for data_file in data_files:
-        file_path = os.path.join(data_dir, data_file)
+    file_kwargs = dict(
+        trials_dir=trials_dir,
+        channel_types=channel_types,
+        answer_path=answer_path,
+        l_freq=l_freq,
+        h_freq=h_freq,
+        notch_freq=notch_freq,
+        n_versions=n_versions,
+        trials_per_file=trials_per_file,
+        total_channels=total_channels,
+        max_bad_channels=max_bad_channels,
+        min_bad_channels=min_bad_channels,
+        do_ica=do_ica,
+        do_trial=do_trial,
+        ica_dir=ica_dir,
+        n_components=n_components,
+        ica_method=ica_method,
+        random_state=random_state,
+        cache_dir=cache_dir,
+        filter_plan=filter_plan,
+        compare_filter=compare_filter,
+        ica_concurrent=ica_concurrent,
+        snippet_length=snippet_length,
+        snippet_offset=snippet_offset,
+        stream=stream,
+        stream_chunk_duration=stream_chunk_duration,
+        catalog_path=catalog_path
+    )
+    if catalog_path:
+        connect(catalog_path).close()  # create the schema once, before workers write to it
+    file_paths = [os.path.join(data_dir, f) for f in data_files]
 
-        # Try to parse out subj_ses_run from the filename
-        # Assumed convention subj_ses_run_whatever.as_long_as_mne_likes_it
-        try:
-            subj, ses, run = data_file.split('_')[:3]
-        except ValueError:
-            print(f"File name {data_file} not in expected subj_ses_run format. Skipping.")
-            continue
-
-        print(f"\n--- Processing File: {data_file} (subj={subj}, ses={ses}, run={run}) ---")
-
-        # -------------------------
-        # 1) Load & Filter
-        # -------------------------
-        raw = mne.io.read_raw(file_path, preload=True, allow_maxshield=True)
-        freqs = [notch_freq * i for i in range(1, 5)]
-        raw.notch_filter(freqs=freqs)
-        raw.filter(l_freq=l_freq, h_freq=None, fir_design='firwin')
-        raw.filter(l_freq=None, h_freq=h_freq, fir_design='firwin')
-
-        # -------------------------
-        # 2) ICA (optional)
-        # -------------------------
-        if do_ica and channel_types:
-            print("[INFO] Running ICA ...")
-            for ch_type in channel_types:
-                if ch_type:
-                    ica_save_path = ica_dir
-                    fit_and_save_ica(
-                        raw=raw,
-                        ica_save_path=ica_save_path,
-                        ica_name = f"{subj}_{ses}_{run}_{ch_type}_ica.fif",
-                        channel_type=ch_type,
-                        n_components=n_components,
-                        method=ica_method,
-                        random_state=random_state
-                    )
-            # Force save preprocessed raw files in .fif format for ICA plot_properties
-            preprocessed_filename = f"{subj}_{ses}_{run}_preprocessed_raw.fif"
-            os.makedirs(config.preprocessed_save_path, exist_ok=True)
-            preprocessed_save_path = os.path.join(config.preprocessed_save_path, preprocessed_filename)
-            
-            raw.save(preprocessed_save_path, overwrite=True)
-            print(f"Preprocessed raw saved at: {preprocessed_save_path}")
-        # -------------------------
-        # 3) Trials (optional)
-        # -------------------------
-        if not do_trial:
-            # If user doesn't want trials, skip
-            continue
-
-        print("[INFO] Generating Trials ...")
-        trial_num = 0
-        for version in range(n_versions):
-            for ch_type in channel_types:
-                # Distinguish bad channels
-                if ch_type == 'eeg':
-                    badC_EEG = answer_data.get("badC_EEG", {})
-                    bad_channels = badC_EEG.get(subj, {}).get(ses, {}).get(run, [])
-                else:
-                    badC_MEG = answer_data.get("badC_MEG", {})
-                    all_meg_bad = badC_MEG.get(subj, {}).get(ses, {}).get(run, [])
-                    if ch_type == 'mag':
-                        bad_channels = [ch for ch in all_meg_bad if ch.endswith('1')]
-                    elif ch_type == 'grad':
-                        bad_channels = [ch for ch in all_meg_bad if ch.endswith(('2','3'))]
-                    else:
-                        bad_channels = []
-
-                ch_out_dir = os.path.join(trials_dir, ch_type)
-                os.makedirs(ch_out_dir, exist_ok=True)
-
-                for _ in range(trials_per_file):
-                    chs_to_display, bad_chans_in_display = select_and_shuffle_channels(
-                        raw=raw,
-                        bad_channels=bad_channels,
-                        channel_type=ch_type,
-                        total_channels=total_channels,
-                        max_bad_channels=max_bad_channels,
-                        min_bad_channels=min_bad_channels
-                    )
-                    trial_data = raw.copy().pick(chs_to_display)
-                    
-                    trial_dict = {
-                        "data": trial_data,
-                        "bad_chans_in_display": bad_chans_in_display,
-                        "channel_type": ch_type
+    results = []
+    t0 = time.perf_counter()
+    if n_jobs <= 1:
+        for file_path in file_paths:
+            result = _run_data_file(file_path, False, file_kwargs)
+            if result["status"] == "failed":
+                print(f"[FAILED] {result['file']}: {result['error']}")
+            results.append(result)
+    else:
+        if blas_threads is None:
+            blas_threads = max(1, (os.cpu_count() or 1) // n_jobs)
+        print(f"[INFO] {len(file_paths)} files over {n_jobs} workers ({blas_threads} BLAS thread(s) each)")
+        file_kwargs["ica_threads"] = blas_threads
+        with ProcessPoolExecutor(
+            max_workers=n_jobs,
+            initializer=_init_worker,
+            initargs=(blas_threads,)
+        ) as executor:
+            futures = {
+                executor.submit(_run_data_file, file_path, True, file_kwargs): file_path
+                for file_path in file_paths
+            }
+            for done, future in enumerate(as_completed(futures), start=1):
+                try:
+                    result = future.result()
+                except BrokenProcessPool as e:
+                    # A worker died (e.g. killed for memory): every file still queued fails with it
+                    result = {
+                        "file": os.path.basename(futures[future]),
+                        "status": "failed",
+                        "error": f"worker pool broken: {e}",
+                        "n_trials": 0,
+                        "n_ica": 0,
+                        "seconds": 0.,
+                        "log": "",
                     }
+                print(result["log"], end="")
+                print(f"[{done}/{len(futures)}] {result['file']} -> {result['status']} ({result['seconds']:.1f}s)")
+                if result["status"] == "failed":
+                    print(f"[FAILED] {result['file']}: {result['error']}")
+                results.append(result)
 
-                    trial_filename = f"{subj}_{ses}_{run}_trial_{trial_num}_{version+1}_{ch_type}.pkl"
-                    trial_filepath = os.path.join(ch_out_dir, trial_filename)
-                    with open(trial_filepath, 'wb') as f:
-                        pickle.dump(trial_dict, f)
-                    
-                    print(f" -> Saved: {trial_filename} | bad={bad_chans_in_display}")
-                    trial_num += 1
-
+    print_summary(results, time.perf_counter() - t0)
     print(f"[DONE] All requested processing complete. (ICA={do_ica}, Trials={do_trial})")
-    print(f"[DONE] You can now remove the raw files.")
+    if not any(r["status"] == "failed" for r in results):
+        print(f"[DONE] You can now remove the raw files.")
@@ -0,0 +1,112 @@
+# recording_cache.py
+# Process-wide LRU cache of preprocessed recordings and ICA solutions for ICA mode.
+# Trials of the same subj_ses_run (e.g. its mag and grad ICAs) reuse the loaded
+# recording instead of reading the *_preprocessed_raw.fif again. Entries are evicted
+# least-recently-used first once their total size exceeds config.recording_cache_bytes
+# or their number exceeds config.recording_cache_entries.
+import os
+import pickle
+import threading
+from collections import OrderedDict
+import config
+
+
+class ByteLRUCache:
+    """
+    Thread-safe LRU mapping whose budget is in bytes, plus an optional cap on the
+    number of entries for values whose size is only estimated.
+    """
+
+    def __init__(self, max_bytes, max_entries=None):
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (value, nbytes)
+        self._total = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_load(self, key, loader, sizeof):
+        """ Cached value of `key`, or `loader()` stored with size `sizeof(value)`. """
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key][0]
+            self.misses += 1
+
+        # Load outside the lock so other lookups are not blocked by disk I/O
+        value = loader()
+        nbytes = sizeof(value)
+        with self._lock:
+            if key in self._entries:
+                return self._entries[key][0]
+            self._entries[key] = (value, nbytes)
+            self._total += nbytes
+            # The newest entry stays even if it alone exceeds the budget
+            while len(self._entries) > 1 and (
+                self._total > self.max_bytes
+                or (self.max_entries is not None and len(self._entries) > self.max_entries)
+            ):
+                _, (_, old_nbytes) = self._entries.popitem(last=False)
+                self._total -= old_nbytes
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._total = 0
+
+    @property
+    def nbytes(self):
+        return self._total
+
+
+def _raw_nbytes(raw):
+    """
+    Samples of a preloaded raw; for a lazy one, an estimate of what its header
+    keeps in memory (measurement info, buffer table of the file, annotations).
+    """
+    if raw.preload:
+        return raw._data.nbytes
+    return len(pickle.dumps((raw.info, raw._raw_extras, raw.annotations), pickle.HIGHEST_PROTOCOL))
+
+
+def _ica_nbytes(ica):
+    arrays = (ica.mixing_matrix_, ica.unmixing_matrix_, ica.pca_components_,
+              ica.pca_mean_, ica.pca_explained_variance_)
+    return sum(a.nbytes for a in arrays if a is not None)
+
+
+recordings = ByteLRUCache(config.recording_cache_bytes, config.recording_cache_entries)
+
+
+def preprocessed_raw_path(subj, ses, run):
+    return os.path.join(config.preprocessed_save_path, f"{subj}_{ses}_{run}_preprocessed_raw.fif")
+
+
+def get_preprocessed_raw(subj, ses, run, preload=None):
+    """
+    The preprocessed recording of subj_ses_run, shared across trials. Unless
+    `preload` (default: not config.ica_lazy_data), only the header is read and
+    samples are fetched from disk when the component properties are plotted.
+    """
+    import mne
+    if preload is None:
+        preload = not config.ica_lazy_data
+    path = preprocessed_raw_path(subj, ses, run)
+    return recordings.get_or_load(
+        ("raw", f"{subj}_{ses}_{run}", preload),
+        lambda: mne.io.read_raw_fif(path, preload=preload, allow_maxshield=True),
+        _raw_nbytes
+    )
+
+
+def get_ica(ica_path):
+    """ The ICA solution stored at `ica_path`, shared across trials. """
+    import mne
+    return recordings.get_or_load(
+        ("ica", os.path.abspath(ica_path)),
+        lambda: mne.preprocessing.read_ica(ica_path),
+        _ica_nbytes
+    )
@@ -0,0 +1,217 @@
+# results_store.py
+# One SQLite database (WAL mode) for all training sessions: the trial plan of
+# each session and every trial result. Each result is written in its own
+# transaction, so a crash never leaves a half-written row, and resuming a
+# session is one indexed query. Sessions and results from the older per-session
+# pickle / CSV files are imported the first time they are resumed.
+# e.g. python results_store.py export   (writes the per-session CSVs to data/results)
+import os
+import csv
+import sys
+import json
+import time
+import pickle
+import sqlite3
+import argparse
+import config
+
+RESULT_FIELDS = [
+    'Trial', 'StartTime_s', 'EndTime_s', 'ChannelType',
+    'SelectedChannels', 'BadChannels',
+    'Hits', 'FalseAlarms', 'Misses', 'CorrectRejections',
+    'Accuracy'
+]
+_INT_FIELDS = ('Trial', 'Hits', 'FalseAlarms', 'Misses', 'CorrectRejections')
+_FLOAT_FIELDS = ('StartTime_s', 'EndTime_s', 'Accuracy')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    participant TEXT NOT NULL,
+    session TEXT NOT NULL,
+    mode TEXT NOT NULL,
+    created REAL NOT NULL,
+    plan TEXT NOT NULL,
+    PRIMARY KEY (participant, session, mode)
+);
+CREATE TABLE IF NOT EXISTS results (
+    participant TEXT NOT NULL,
+    session TEXT NOT NULL,
+    mode TEXT NOT NULL,
+    condition TEXT NOT NULL,
+    trial INTEGER NOT NULL,
+    start_time REAL,
+    end_time REAL,
+    channel_type TEXT,
+    selected TEXT,
+    bad TEXT,
+    hits INTEGER,
+    false_alarms INTEGER,
+    misses INTEGER,
+    correct_rejections INTEGER,
+    accuracy REAL,
+    PRIMARY KEY (participant, session, mode, condition, trial)
+);
+"""
+# results column -> CSV field
+_RESULT_COLUMNS = {
+    'trial': 'Trial',
+    'start_time': 'StartTime_s',
+    'end_time': 'EndTime_s',
+    'channel_type': 'ChannelType',
+    'selected': 'SelectedChannels',
+    'bad': 'BadChannels',
+    'hits': 'Hits',
+    'false_alarms': 'FalseAlarms',
+    'misses': 'Misses',
+    'correct_rejections': 'CorrectRejections',
+    'accuracy': 'Accuracy',
+}
+
+
+def legacy_session_path(participant, session, mode):
+    return os.path.join(config.session_dir, f"{participant}_{session}_{mode}.pkl")
+
+
+def csv_name(participant, session, mode, condition):
+    return f"results_{participant}_{session}_{mode}_{condition}.csv"
+
+
+class ResultsStore:
+    """ Sessions (trial plans) and trial results of all participants. """
+
+    def __init__(self, db_path=config.results_db):
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # autocommit; transactions are opened explicitly where needed
+        self.conn = sqlite3.connect(db_path, timeout=60, isolation_level=None)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(_SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def session_plan(self, participant, session, mode, make_plan):
+        """
+        The trial plan (list of trial dicts) of a session. If the session does not
+        exist yet, it is imported from a legacy pickle or created with
+        `make_plan()`; a None plan is not stored. Two trainers starting the same
+        session at once get the same plan.
+        """
+        key = (participant, session, mode)
+        row = self.conn.execute(
+            "SELECT plan FROM sessions WHERE participant = ? AND session = ? AND mode = ?", key
+        ).fetchone()
+        if row is not None:
+            return json.loads(row["plan"])
+
+        legacy_path = legacy_session_path(*key)
+        if os.path.exists(legacy_path):
+            with open(legacy_path, "rb") as f:
+                plan = pickle.load(f)
+            print(f"Session imported from {legacy_path}")
+        else:
+            plan = make_plan()
+            if plan is None:
+                return None
+
+        # INSERT OR IGNORE + re-read: whoever committed first wins
+        self.conn.execute(
+            "INSERT OR IGNORE INTO sessions (participant, session, mode, created, plan) VALUES (?, ?, ?, ?, ?)",
+            (*key, time.time(), json.dumps(plan))
+        )
+        row = self.conn.execute(
+            "SELECT plan FROM sessions WHERE participant = ? AND session = ? AND mode = ?", key
+        ).fetchone()
+        return json.loads(row["plan"])
+
+    def results(self, participant, session, mode, condition):
+        """ Completed trial results of a session as CSV-layout dicts, ordered by trial. """
+        key = (participant, session, mode, condition)
+        rows = self._select_results(key)
+        if not rows:
+            self._import_legacy_csv(key)
+            rows = self._select_results(key)
+        return rows
+
+    def add_result(self, participant, session, mode, condition, row_dict):
+        """ Store one trial result atomically (a repeated trial replaces the old row). """
+        columns = list(_RESULT_COLUMNS)
+        self.conn.execute(
+            f"INSERT OR REPLACE INTO results (participant, session, mode, condition, {', '.join(columns)}) "
+            f"VALUES ({', '.join('?' * (4 + len(columns)))})",
+            (participant, session, mode, condition, *(row_dict[_RESULT_COLUMNS[c]] for c in columns))
+        )
+
+    def _select_results(self, key):
+        rows = self.conn.execute(
+            f"SELECT {', '.join(_RESULT_COLUMNS)} FROM results "
+            "WHERE participant = ? AND session = ? AND mode = ? AND condition = ? ORDER BY trial",
+            key
+        ).fetchall()
+        return [{field: row[column] for column, field in _RESULT_COLUMNS.items()} for row in rows]
+
+    def _import_legacy_csv(self, key):
+        csv_path = os.path.join(config.res_dir, csv_name(*key))
+        if not os.path.exists(csv_path):
+            return
+        rows = []
+        with open(csv_path, "r", newline="") as f:
+            for row in csv.DictReader(f):
+                try:
+                    for field in _INT_FIELDS:
+                        row[field] = int(row[field])
+                    for field in _FLOAT_FIELDS:
+                        row[field] = float(row[field])
+                except (KeyError, ValueError):
+                    continue
+                rows.append(row)
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            for row in rows:
+                self.add_result(*key, row)
+            self.conn.execute("COMMIT")
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+        print(f"{len(rows)} results imported from {csv_path}")
+
+    def export_csv(self, out_dir=config.res_dir):
+        """ One CSV per participant/session/mode/condition, in the layout of the old results files. """
+        os.makedirs(out_dir, exist_ok=True)
+        keys = self.conn.execute(
+            "SELECT DISTINCT participant, session, mode, condition FROM results"
+        ).fetchall()
+        paths = []
+        for key in keys:
+            key = tuple(key)
+            path = os.path.join(out_dir, csv_name(*key))
+            tmp_path = path + '.tmp'
+            with open(tmp_path, 'w', newline='') as f:
+                writer = csv.DictWriter(f, fieldnames=RESULT_FIELDS)
+                writer.writeheader()
+                writer.writerows(self._select_results(key))
+            os.replace(tmp_path, path)
+            paths.append(path)
+        return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Training results store.")
+    parser.add_argument("command", choices=["export"], help="export: write the per-session results CSVs.")
+    parser.add_argument("--db", default=config.results_db, help=f"Results database (default={config.results_db}).")
+    parser.add_argument("--out", default=config.res_dir, help=f"Output directory for CSVs (default={config.res_dir}).")
+    args = parser.parse_args()
+
+    store = ResultsStore(args.db)
+    try:
+        paths = store.export_csv(args.out)
+    finally:
+        store.close()
+    print(f"[DONE] {len(paths)} results file(s) written to {args.out}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,6 +1,8 @@
 from scipy.stats import norm
 import os
-import random
+import numpy as np
+import trial_catalog
+from concurrent.futures import ThreadPoolExecutor, wait
 def compute_dprime(hits, false_alarms, misses, correct_rejections):
     """
     Compute d-prime based on hits/misses/false alarms/correct rejections.
@@ -31,17 +33,88 @@ def compute_dprime(hits, false_alarms, misses, correct_rejections):
     # crit_prime = crit / dprime    
     return dprime
 
-def collect_files(data_path, channel_types, file_extension, mode):
-    all_files = []
-    for ch_type in channel_types:
-        ch_dir = os.path.join(data_path, ch_type)
-        if os.path.isdir(ch_dir):
-            files_in_ch_dir = [
-                f for f in os.listdir(ch_dir) if f.endswith(file_extension)
-            ]
-            all_files.extend([(ch_type, file) for file in files_in_ch_dir])
-        else:
-            print(f"Warning: {ch_dir} not found or is not a directory.")
+class RunningMetrics:
+    """
+    Running totals of hits/false alarms/misses/correct rejections per channel type.
+    add() is O(1) per trial; accuracy and d' come from the totals, not from the trial list.
+    """
+    def __init__(self):
+        self.totals = {}  # ch_type -> [hits, false_alarms, misses, correct_rejections, n_trials]
+
+    def add(self, ch_type, hits, false_alarms, misses, correct_rejections):
+        totals = self.totals.setdefault(ch_type, [0, 0, 0, 0, 0])
+        totals[0] += hits
+        totals[1] += false_alarms
+        totals[2] += misses
+        totals[3] += correct_rejections
+        totals[4] += 1
+
+    def summary(self, ch_type):
+        """ {'trials', 'accuracy', 'dprime'} of one channel type. """
+        hits, false_alarms, misses, correct_rejections, n_trials = self.totals[ch_type]
+        denom = hits + false_alarms + misses + correct_rejections
+        return {
+            "trials": n_trials,
+            "accuracy": (hits + correct_rejections) / denom if denom > 0 else 0,
+            "dprime": compute_dprime(hits, false_alarms, misses, correct_rejections),
+        }
+
+    def summaries(self):
+        return {ch_type: self.summary(ch_type) for ch_type in sorted(self.totals)}
+
+def signal_detection_metrics(hits, false_alarms, misses, correct_rejections):
+    """
+    Vectorized counterpart of compute_dprime for arrays of counts: hit rate,
+    false-alarm rate, accuracy, d' and criterion c = -(Z(HR) + Z(FAR)) / 2.
+    Rates are the raw proportions; d' and c use the same log-linear correction as
+    compute_dprime, with one norm.ppf call for all groups. Groups without signal or
+    noise trials get d' = c = 0, as in compute_dprime.
+    """
+    hits, false_alarms, misses, correct_rejections = (
+        np.asarray(x, dtype=float) for x in (hits, false_alarms, misses, correct_rejections)
+    )
+    total_signal = hits + misses
+    total_noise = false_alarms + correct_rejections
+    total = total_signal + total_noise
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        hit_rate = np.where(total_signal > 0, hits / total_signal, np.nan)
+        fa_rate = np.where(total_noise > 0, false_alarms / total_noise, np.nan)
+        accuracy = np.where(total > 0, (hits + correct_rejections) / total, 0.)
+
+    p = np.concatenate([(hits + 0.5) / (total_signal + 1.0), (false_alarms + 0.5) / (total_noise + 1.0)])
+    z_hit, z_fa = np.split(norm.ppf(p), 2)
+    valid = (total_signal > 0) & (total_noise > 0)
+    return {
+        "hit_rate": hit_rate,
+        "fa_rate": fa_rate,
+        "accuracy": accuracy,
+        "dprime": np.where(valid, z_hit - z_fa, 0.),
+        "criterion": np.where(valid, -(z_hit + z_fa) / 2, 0.),
+    }
+
+def collect_files(data_path, channel_types, file_extension, mode, filters=None):
+    """
+    Trial files of `mode` under data_path/<ch_type>, as catalog rows (dicts with
+    at least 'ch_type', 'file' and 'subj'). Read from the trial catalog; if it has
+    no entries for existing files (trials made before it existed, or moved since),
+    the directories are listed.
+    `filters`: see trial_catalog.query, e.g. {"n_bad": (2, None), "subj": ["S1", "S2"]}.
+    """
+    all_files = trial_catalog.query(mode, data_path, channel_types, filters)
+
+    if not all_files:
+        if filters:
+            print("Warning: the trial catalog has no entries for these trials, filters are ignored. Run trial_catalog.py to index existing trials.")
+        for ch_type in channel_types:
+            ch_dir = os.path.join(data_path, ch_type)
+            if os.path.isdir(ch_dir):
+                files_in_ch_dir = [
+                    f for f in os.listdir(ch_dir) if f.endswith(file_extension)
+                ]
+                all_files.extend([{"ch_type": ch_type, "file": file, "subj": file.split('_')[0]} for file in files_in_ch_dir])
+            else:
+                print(f"Warning: {ch_dir} not found or is not a directory.")
     
     if len(all_files) == 0:
         print(f"No {mode} files found for the specified channel types.")
@@ -52,18 +125,62 @@ def collect_files(data_path, channel_types, file_extension, mode):
 def process_trial_files(all_files, n_trials, mode, data_path):
 
     trials_list = []
-    chosen_files = random.sample(all_files, min(n_trials, len(all_files)))
+    # Spread the session over channel types and subjects before repeating any
+    chosen_files = trial_catalog.stratified_sample(all_files, n_trials, strata=("ch_type", "subj"))
 
-    for trial_idx, (ch_type, trial_file) in enumerate(chosen_files, start=1):
+    for trial_idx, row in enumerate(chosen_files, start=1):
 
-        full_path = os.path.join(data_path, ch_type, trial_file) 
+        full_path = os.path.join(data_path, row["ch_type"], row["file"]) 
         
         trials_list.append({
             "Trial": trial_idx,
-            "trial_file": trial_file,
-            "ch_type": ch_type,
+            "trial_file": row["file"],
+            "ch_type": row["ch_type"],
             "trial_path": full_path,
             "mode": mode
         })
     
-    return trials_list
\ No newline at end of file
+    return trials_list
+
+
+class TrialPrefetcher:
+    """
+    Loads upcoming trials on a worker thread while the current one is being annotated.
+    At most `lookahead` trials beyond the one on screen are loaded or queued.
+    """
+    def __init__(self, trials, load_func, lookahead=1):
+        self._trials = trials
+        self._load_func = load_func
+        self._lookahead = max(0, lookahead)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="trial-prefetch")
+        self._futures = {}
+        self._next = 0
+
+    def _schedule(self, upto):
+        while self._next <= min(upto, len(self._trials) - 1):
+            self._futures[self._next] = self._executor.submit(self._load_func, self._trials[self._next])
+            self._next += 1
+
+    def get(self, index, idle=None):
+        """
+        Result of load_func for trial `index`. Queues the following trials first,
+        so they load while this one is shown. While waiting, `idle()` is called
+        regularly (e.g. to keep the Tk windows responsive).
+        """
+        self._schedule(index)
+        future = self._futures.pop(index)
+        for stale in [i for i in self._futures if i < index]:
+            self._futures.pop(stale).cancel()
+        self._schedule(index + self._lookahead)
+        while not future.done():
+            if idle is not None:
+                idle()
+            wait([future], timeout=0.02)
+        return future.result()
+
+    def close(self):
+        """ Drop queued loads; a load already running finishes in the background and is discarded. """
+        for future in self._futures.values():
+            future.cancel()
+        self._futures.clear()
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -1,42 +1,115 @@
 import tkinter as tk
 from tkinter import messagebox
 import os
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+import threading
+from collections import OrderedDict
+from PIL import Image, ImageTk
+import config
+
+SLIDE_SIZE = (640, 480)  # Display area in pixels; slides are scaled to fit
+
+
+def list_slides(slide_folder):
+    return [os.path.join(slide_folder, f) for f in sorted(os.listdir(slide_folder)) if f.endswith(('.png', '.jpg'))]
+
+
+class SlideCache:
+    """
+    Decoded slides, already scaled to the display size, at most `max_slides` of them
+    (least recently used dropped first). Thread-safe: filled by a background thread,
+    read by the Tk thread.
+    """
+    def __init__(self, max_slides=config.slide_cache_size, size=SLIDE_SIZE):
+        self.max_slides = max_slides
+        self.size = size
+        self._images = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _decode(self, path):
+        with Image.open(path) as img:
+            img.draft('RGB', self.size)  # JPEG: decode at a reduced scale directly
+            img = img.convert('RGB')
+        img.thumbnail(self.size, Image.LANCZOS)
+        return img
+
+    def get(self, path):
+        """ The scaled slide at `path`, decoded now if it is not cached. """
+        with self._lock:
+            if path in self._images:
+                self._images.move_to_end(path)
+                return self._images[path]
+        img = self._decode(path)
+        with self._lock:
+            self._images[path] = img
+            while len(self._images) > self.max_slides:
+                self._images.popitem(last=False)
+        return img
+
+    def preload(self, paths):
+        """ Decode `paths` (up to the cache size) on a daemon thread. Returns the thread. """
+        def work():
+            for path in paths[:self.max_slides]:
+                try:
+                    self.get(path)
+                except OSError as e:
+                    print(f"[SLIDES] Cannot read {path}: {e}")
+        thread = threading.Thread(target=work, name="slide-preload", daemon=True)
+        thread.start()
+        return thread
+
+
+_cache = SlideCache()
+
+
+def preload_slides(slide_folder):
+    """ Start decoding the slides of `slide_folder` in the background (e.g. at startup). """
+    if os.path.isdir(slide_folder):
+        return _cache.preload(list_slides(slide_folder))
 
 
 def display_slides(slide_folder, master=None):
     """
     Displays slides in a separate, modal-like Tkinter window, blocking further code execution until closed.
+    Slides come from the preloaded cache (see preload_slides); a step only swaps the shown image.
 
     Args:
         slide_folder (str): Directory containing slides.
         master (tk.Tk or tk.Toplevel): The parent window. If None, uses the default root window.
     """
     # Load slides from folder
-    slides = [os.path.join(slide_folder, f) for f in sorted(os.listdir(slide_folder)) if f.endswith(('.png', '.jpg'))]
+    slides = list_slides(slide_folder)
     if not slides:
         print("No slides found in the folder.")
         return
+    _cache.preload(slides)  # no-op work for slides already decoded
 
     slide_window = tk.Toplevel(master)
     slide_window.title("Slide Show")
 
-    fig = plt.Figure()
-    ax = fig.add_subplot(111)
-    slide_image = plt.imread(slides[0])
-    img_display = ax.imshow(slide_image)
-    ax.axis('off')  # Hide axes
-
-    canvas = FigureCanvasTkAgg(fig, master=slide_window)
-    canvas.get_tk_widget().grid(row=0, column=0, columnspan=2)
+    width, height = _cache.size
+    img_label = tk.Label(slide_window, width=width, height=height, bg="white")
+    img_label.grid(row=0, column=0, columnspan=2)
     current_slide = [0]
+    photos = {}  # slide index -> Tk image, built once per window
+
+    def photo(index):
+        if index not in photos:
+            photos[index] = ImageTk.PhotoImage(_cache.get(slides[index]), master=slide_window)
+        return photos[index]
+
+    def prepare_neighbours():
+        """ Build the Tk images of the adjacent slides while the trainee reads this one; drop the others. """
+        if not slide_window.winfo_exists():
+            return
+        keep = {i for i in range(current_slide[0] - 1, current_slide[0] + 2) if 0 <= i < len(slides)}
+        for index in set(photos) - keep:
+            del photos[index]
+        for index in keep:
+            photo(index)
 
     def update_slide():
         """Updates the displayed slide on the canvas and updates button states."""
-        slide_image = plt.imread(slides[current_slide[0]])
-        img_display.set_data(slide_image)
-        canvas.draw()
+        img_label.config(image=photo(current_slide[0]))
         if current_slide[0] == len(slides) - 1:
             # Last slide: change "Next" button to "End"
             btn_next.config(text="End", command=end_slideshow)
@@ -47,6 +120,7 @@ def display_slides(slide_folder, master=None):
             btn_prev.config(state="disabled")
         else:
             btn_prev.config(state="normal")
+        slide_window.after_idle(prepare_neighbours)
 
     def next_slide():
         if current_slide[0] < len(slides) - 1:
@@ -60,15 +134,15 @@ def display_slides(slide_folder, master=None):
 
     def end_slideshow():
         slide_window.destroy()
-        
+
     # Previous and Next buttons
     btn_prev = tk.Button(slide_window, text="Previous", command=prev_slide)
     btn_prev.grid(row=1, column=0, sticky="ew")
     btn_next = tk.Button(slide_window, text="Next", command=next_slide)
     btn_next.grid(row=1, column=1, sticky="ew")
+    update_slide()
 
     # Wait for the slide window to close before returning to main code
     slide_window.transient()
     slide_window.grab_set()
     slide_window.wait_window()
-
@@ -0,0 +1,100 @@
+# stream_preproc.py
+# Out-of-core preprocessing for recordings larger than RAM.
+# The raw file is opened without preload, filtered chunk by chunk with the combined
+# kernel from filter_plan.py, and written to a float32 .npy sidecar (+ .json header
+# in the trial_io layout). Trials are then cut from the memory-mapped sidecar, so peak
+# memory is bounded by the chunk size instead of the recording length.
+import os
+import json
+import math
+import numpy as np
+import mne
+import config
+from filter_plan import design_filter_plan, stream_filter
+from trial_io import TRIAL_FORMAT_VERSION, TRIAL_HEADER_EXT, TRIAL_DATA_EXT, load_trial_array
+
+
+def stream_filter_recording(
+    file_path,
+    out_base,
+    l_freq=0.1,
+    h_freq=80,
+    notch_freq=50,
+    chunk_duration=config.stream_chunk_duration
+):
+    """
+    Filter `file_path` into `<out_base>.npy` (float32, n_channels x n_times)
+    and describe it in `<out_base>.json`. Returns the header path.
+    """
+    raw = mne.io.read_raw(file_path, preload=False, allow_maxshield=True)
+    sfreq = float(raw.info['sfreq'])
+    kernel = design_filter_plan(sfreq, l_freq, h_freq, notch_freq)
+    chunk_samples = max(1, int(chunk_duration * sfreq))
+    print(f"[STREAM] {os.path.basename(file_path)}: {raw.n_times} samples in chunks of {chunk_samples} "
+          f"(+{len(kernel) // 2} overlap each side)")
+
+    data_path = out_base + TRIAL_DATA_EXT
+    out = np.lib.format.open_memmap(
+        data_path, mode='w+', dtype=np.float32, shape=(int(raw.info['nchan']), int(raw.n_times))
+    )
+    stream_filter(raw, out, kernel, chunk_samples)
+    out.flush()
+    del out
+
+    header = {
+        "format_version": TRIAL_FORMAT_VERSION,
+        "data_file": os.path.basename(data_path),
+        "shape": [int(raw.info['nchan']), int(raw.n_times)],
+        "dtype": "float32",
+        "ch_names": raw.ch_names,
+        "ch_types": raw.get_channel_types(),
+        "sfreq": sfreq,
+        "highpass": float(l_freq) if l_freq is not None else float(raw.info['highpass']),
+        "lowpass": float(h_freq) if h_freq is not None else float(raw.info['lowpass']),
+        "tmin": 0.,
+        "bads": list(raw.info['bads']),
+        "source": os.path.abspath(file_path),
+    }
+    header_path = out_base + TRIAL_HEADER_EXT
+    with open(header_path, 'w') as f:
+        json.dump(header, f)
+    return header_path
+
+
+def open_streamed_recording(file_path, header_path):
+    """
+    Return (raw, data): the original recording opened without preload, with its
+    info updated to the filter band, and the memory-mapped filtered samples.
+    `raw` only serves channel names / info; samples come from `data`.
+    """
+    raw = mne.io.read_raw(file_path, preload=False, allow_maxshield=True)
+    data = load_trial_array(header_path)
+    with open(header_path, 'r') as f:
+        header = json.load(f)
+    with raw.info._unlock():
+        raw.info['highpass'] = header["highpass"]
+        raw.info['lowpass'] = header["lowpass"]
+    return raw, data
+
+
+def decimated_raw(raw, data, h_freq, chunk_duration=config.stream_chunk_duration):
+    """
+    In-memory RawArray of the filtered recording decimated in time, so ICA can be
+    fitted in streaming mode. The factor keeps the sampling rate above 3 x h_freq;
+    data are already low-passed, so plain subsampling does not alias.
+    """
+    sfreq = raw.info['sfreq']
+    decim = max(1, int(sfreq // (3 * h_freq))) if h_freq else 1
+    n_times = data.shape[1]
+    chunk_samples = max(decim, int(chunk_duration * sfreq) // decim * decim)
+
+    out = np.empty((data.shape[0], math.ceil(n_times / decim)))
+    for start in range(0, n_times, chunk_samples):
+        stop = min(start + chunk_samples, n_times)
+        out[:, start // decim:start // decim + math.ceil((stop - start) / decim)] = data[:, start:stop:decim]
+
+    info = raw.info.copy()
+    with info._unlock():
+        info['sfreq'] = sfreq / decim
+    print(f"[STREAM] ICA data decimated by {decim} ({sfreq:g} -> {sfreq / decim:g} Hz)")
+    return mne.io.RawArray(out, info, verbose=False)
@@ -0,0 +1,139 @@
+# topo_grid.py
+# Precomputed ICA topomap images.
+# Next to each <name>_ica.fif, fit_and_save_ica writes <name>_ica_topo.npz with the
+# interpolated topomap of every component (float32, res x res), its colour limits,
+# the head outline, the clip path and the sensor positions. ICA trials then draw
+# the grid with imshow instead of interpolating all components live.
+# e.g. python topo_grid.py data/ica   (backfills grids for existing ICA files)
+import os
+import sys
+import numpy as np
+
+GRID_VERSION = 1
+
+
+def topo_grid_path(ica_path):
+    return os.path.splitext(ica_path)[0] + '_topo.npz'
+
+
+def compute_topo_grid(
+    ica,
+    ch_type=None,
+    res=64,
+    image_interp="cubic",
+    extrapolate="auto",
+    border="mean",
+    sphere=None,
+    outlines="head"
+):
+    """ Topomap images of all components, as custome_ica_plot would interpolate them. """
+    from mne.viz import _get_plot_ch_type
+    from mne.viz.utils import _setup_vmin_vmax
+    from mne.viz.topomap import _prepare_topomap_plot, _make_head_outlines, _setup_interp, _check_extrapolate
+    from mne.channels.layout import _merge_ch_data
+
+    ch_type = _get_plot_ch_type(ica, ch_type)
+    data_picks, pos, merge_channels, _, ch_type, sphere, clip_origin = _prepare_topomap_plot(ica, ch_type, sphere=sphere)
+    pos = pos[:, :2]
+    outlines = _make_head_outlines(sphere, pos, outlines, clip_origin)
+    extrapolate = _check_extrapolate(extrapolate, ch_type)
+    extent, Xi, Yi, interp = _setup_interp(pos, res, image_interp, extrapolate, outlines, border)
+
+    data = np.dot(ica.mixing_matrix_.T, ica.pca_components_[:ica.n_components_])
+    data = np.atleast_2d(data)[:, data_picks]
+    images = np.empty((len(data), res, res), dtype=np.float32)
+    vlims = np.empty((len(data), 2))
+    for ii, data_ in enumerate(data):
+        if merge_channels:
+            data_, _ = _merge_ch_data(data_, ch_type, [])
+        data_ = data_.flatten()
+        vlims[ii] = _setup_vmin_vmax(data_, None, None)
+        interp.set_values(data_)
+        images[ii] = interp.set_locations(Xi, Yi)()
+
+    # Same clipping as mne's head patch: the sensor hull for 'local' extrapolation, else the head ellipse
+    if extrapolate == "local":
+        clip_path = np.asarray(interp.mask_pts)
+    else:
+        theta = np.linspace(0, 2 * np.pi, 101)
+        radius, origin = outlines["clip_radius"], outlines.get("clip_origin", (0., 0.))
+        clip_path = np.c_[origin[0] + radius[0] * np.cos(theta), origin[1] + radius[1] * np.sin(theta)]
+
+    grid = {
+        "version": np.array(GRID_VERSION),
+        "ch_type": np.array(ch_type),
+        "names": np.array(ica._ica_names),
+        "images": images,
+        "vlims": vlims,
+        "extent": np.asarray(extent, dtype=float),
+        "pos": pos,
+        "clip_path": clip_path,
+    }
+    for key, value in outlines.items():
+        if "mask" in key or key in ("clip_radius", "clip_origin", "patch"):
+            continue
+        grid[f"outline_{key}"] = np.asarray(value, dtype=float)
+    return grid
+
+
+def save_topo_grid(ica, ica_path, **kwargs):
+    """ Compute and write the grid of the ICA saved at `ica_path`. Returns the grid path. """
+    path = topo_grid_path(ica_path)
+    tmp_path = path + f'.{os.getpid()}.tmp.npz'
+    np.savez_compressed(tmp_path, **compute_topo_grid(ica, **kwargs))
+    os.replace(tmp_path, path)
+    return path
+
+
+def load_topo_grid(ica_path):
+    """
+    The grid of `ica_path` as a dict of arrays, or None if it is missing, from an
+    older format, or older than the ICA file (then the trial plots live).
+    """
+    path = topo_grid_path(ica_path)
+    try:
+        if os.path.getmtime(path) < os.path.getmtime(ica_path):
+            return None
+        with np.load(path) as npz:
+            grid = {key: npz[key] for key in npz.files}
+    except (OSError, ValueError):
+        return None
+    if int(grid.get("version", -1)) != GRID_VERSION:
+        return None
+    return grid
+
+
+def draw_topo(ax, grid, ii, cmap="RdBu_r", sensors=True):
+    """ Draw component `ii` of `grid` into `ax`; returns the image like plot_topomap. """
+    from matplotlib.patches import Polygon
+
+    vmin, vmax = grid["vlims"][ii]
+    im = ax.imshow(
+        grid["images"][ii], cmap=cmap, origin="lower", aspect="equal",
+        extent=tuple(grid["extent"]), interpolation="bilinear", vmin=vmin, vmax=vmax,
+    )
+    im.set_clip_path(Polygon(grid["clip_path"], closed=True, transform=ax.transData))
+    if sensors:
+        ax.scatter(*grid["pos"].T, s=0.25, marker="o", edgecolor="k", facecolor="none")
+    for key in grid:
+        if key.startswith("outline_"):
+            ax.plot(*grid[key], color="k", linewidth=1, clip_on=False)
+    return im
+
+
+def main(ica_dir):
+    """ Write missing or outdated grids for all *_ica.fif files under `ica_dir`. """
+    import mne
+    for root, _, files in os.walk(ica_dir):
+        for fname in sorted(files):
+            if not fname.endswith('_ica.fif'):
+                continue
+            ica_path = os.path.join(root, fname)
+            if load_topo_grid(ica_path) is None:
+                save_topo_grid(mne.preprocessing.read_ica(ica_path, verbose=False), ica_path)
+                print(f"[TOPO] {fname} → {os.path.basename(topo_grid_path(ica_path))}")
+
+
+if __name__ == "__main__":
+    import config
+    main(sys.argv[1] if len(sys.argv) > 1 else config.ica_dir)
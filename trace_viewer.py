@@ -0,0 +1,215 @@
+# trace_viewer.py
+# Lightweight browser for MEEG trials, used by the trainer instead of raw.plot().
+# All channels are one LineCollection fed from a min/max envelope pyramid
+# (decimation factors 1, 2, 4, ...): a window is drawn as one min/max bin per
+# screen pixel, reduced from the nearest pyramid level, so opening a trial and
+# scrolling cost the same whatever the sampling rate. Channel names are pickable Text artists, as in
+# mne's browser, so a 'pick_event' handler gets the clicked name with
+# event.artist.get_text().
+# Keys: left/right scroll a quarter window (shift+left/right: a whole window),
+# home/end, +/- amplitude. The mouse wheel scrolls; clicking the bar below jumps.
+import math
+import numpy as np
+import matplotlib.pyplot as plt
+from matplotlib.collections import LineCollection
+from matplotlib.patches import Rectangle
+from matplotlib.transforms import blended_transform_factory
+from mne.defaults import _handle_default
+
+CLIPPING = 0.75  # traces are clipped at 1.5x the space of their channel, as in mne's browser
+TRACE_COLOR = 'k'
+BAD_COLOR = 'lightgray'
+SELECTED_COLOR = 'r'
+
+
+class EnvelopePyramid:
+    """
+    Min/max envelopes of a (n_channels, n_times) array at decimation factors
+    1, 2, 4, ... down to about `min_bins` bins. Building reads the data once;
+    every window is then drawn from a fixed number of vertices per channel.
+    """
+    def __init__(self, data, min_bins=256):
+        data = np.asarray(data, dtype=np.float32)
+        self.n_times = data.shape[1]
+        self.levels = [(data, data)]
+        low = high = data
+        while low.shape[1] >= 2 * min_bins:
+            if low.shape[1] % 2:
+                low = np.concatenate([low, low[:, -1:]], axis=1)
+                high = np.concatenate([high, high[:, -1:]], axis=1)
+            low = np.minimum(low[:, 0::2], low[:, 1::2])
+            high = np.maximum(high[:, 0::2], high[:, 1::2])
+            self.levels.append((low, high))
+
+    def window(self, start, stop, n_bins):
+        """
+        Samples [start, stop) reduced to `n_bins` (min, max) bins, as (x in samples,
+        values (n_channels, 2 * n_bins)) alternating bin minimum and maximum; windows
+        of at most 2 * n_bins samples are returned as they are. The work depends on
+        n_bins only: the finest level with at least n_bins bins is reduced further.
+        """
+        if stop - start <= 2 * n_bins:
+            low = self.levels[0][0]
+            return np.arange(start, stop), np.asarray(low[:, start:stop])
+        level = int(math.floor(math.log2((stop - start) / n_bins)))
+        level = min(level, len(self.levels) - 1)
+        factor = 2 ** level
+        low, high = self.levels[level]
+        first, last = start // factor, min(low.shape[1], -(-stop // factor))
+        n_bins = min(n_bins, last - first)
+        edges = first + (np.arange(n_bins) * (last - first)) // n_bins
+        x = np.repeat((edges + (last - first) / (2 * n_bins)) * factor, 2)
+        values = np.empty((low.shape[0], 2 * n_bins), dtype=low.dtype)
+        values[:, 0::2] = np.minimum.reduceat(low[:, first:last], edges - first, axis=1)
+        values[:, 1::2] = np.maximum.reduceat(high[:, first:last], edges - first, axis=1)
+        return x, values
+
+
+def _channel_scalings(raw, pyramid, scalings=None):
+    """ Data value per half channel spacing of every channel (mne's raw.plot scalings; 'auto' from the data). """
+    scalings = _handle_default('scalings_plot_raw', scalings)
+    ch_types = np.array(raw.get_channel_types())
+    coarse_low, coarse_high = pyramid.levels[-1]
+    per_channel = np.ones(len(ch_types))
+    for ch_type in np.unique(ch_types):
+        picks = ch_types == ch_type
+        scaling = scalings.get(ch_type, 'auto')
+        if scaling == 'auto':
+            # As mne: half the 0.5-99.5 percentile range, here of the coarsest envelope
+            scaling = (np.percentile(coarse_high[picks], 99.5) - np.percentile(coarse_low[picks], 0.5)) / 2
+        per_channel[picks] = scaling if scaling > 0 else 1.
+    return per_channel
+
+
+class TraceViewer:
+    """
+    Browser of one trial (mne Raw): all channels stacked, `duration` seconds at a time.
+    `pyramid`: the EnvelopePyramid of the trial's data, if already built (e.g. on the
+    prefetch thread). The figure is a pyplot figure, available as `fig`.
+    """
+    def __init__(self, raw, duration=2., title=None, pyramid=None, scalings=None):
+        self.sfreq = raw.info['sfreq']
+        self.ch_names = list(raw.ch_names)
+        self.pyramid = pyramid if pyramid is not None else EnvelopePyramid(raw.get_data())
+        n_channels = len(self.ch_names)
+        self.total_duration = self.pyramid.n_times / self.sfreq
+        self.duration = min(duration, self.total_duration)
+        self.t_start = 0.
+        self.amplitude = 1.
+        self._scale = (1. / (2 * _channel_scalings(raw, self.pyramid, scalings)))[:, np.newaxis]
+        self._offsets = np.arange(n_channels)[:, np.newaxis]
+        self._bads = set(raw.info['bads'])
+        self._selected = set()
+
+        self.fig = plt.figure(figsize=(10, 7))
+        if self.fig.canvas.manager is not None:
+            if title:
+                self.fig.canvas.manager.set_window_title(title)
+            # Arrow keys scroll here instead of driving the toolbar history
+            self.fig.canvas.mpl_disconnect(self.fig.canvas.manager.key_press_handler_id)
+        self.ax = self.fig.add_axes([0.12, 0.14, 0.85, 0.8])
+        self.ax.set_ylim(n_channels - 0.5, -0.5)
+        self.ax.set_yticks([])
+        self.ax.set_xlabel("Time (s)")
+        label_transform = blended_transform_factory(self.ax.transAxes, self.ax.transData)
+        self.labels = [
+            self.ax.text(-0.01, ii, name, transform=label_transform, ha='right', va='center', picker=True)
+            for ii, name in enumerate(self.ch_names)
+        ]
+        self.traces = LineCollection([], linewidths=0.5)
+        self.ax.add_collection(self.traces)
+
+        self._update_colors(draw=False)
+
+        self.ax_scroll = self.fig.add_axes([0.12, 0.04, 0.85, 0.025])
+        self.ax_scroll.set_xlim(0, self.total_duration)
+        self.ax_scroll.set_ylim(0, 1)
+        self.ax_scroll.set_xticks([])
+        self.ax_scroll.set_yticks([])
+        self.scroll_box = Rectangle((0, 0), self.duration, 1, facecolor='gray', alpha=0.5)
+        self.ax_scroll.add_patch(self.scroll_box)
+        # What changes on scroll is drawn by blitting over the cached rest of the figure
+        self._animated = (self.traces, self.ax.xaxis, self.scroll_box)
+        for artist in self._animated:
+            artist.set_animated(True)
+        self._background = None
+
+        self.fig.canvas.mpl_connect('key_press_event', self._on_key)
+        self.fig.canvas.mpl_connect('scroll_event', self._on_scroll)
+        self.fig.canvas.mpl_connect('button_press_event', self._on_click)
+        self.fig.canvas.mpl_connect('resize_event', lambda event: self._update(draw=False))  # a full draw follows
+        self.fig.canvas.mpl_connect('draw_event', self._on_draw)
+        self._update(draw=False)
+
+    def set_selected(self, ch_name, selected):
+        """ Show `ch_name` as selected (red label and trace) or not. """
+        if selected:
+            self._selected.add(ch_name)
+        else:
+            self._selected.discard(ch_name)
+        self._update_colors()
+
+    def scroll_to(self, t_start):
+        t_start = min(max(0., t_start), self.total_duration - self.duration)
+        if t_start != self.t_start:
+            self.t_start = t_start
+            self._update()
+
+    def _update_colors(self, draw=True):
+        colors = []
+        for name, label in zip(self.ch_names, self.labels):
+            color = SELECTED_COLOR if name in self._selected else BAD_COLOR if name in self._bads else TRACE_COLOR
+            label.set_color(color)
+            colors.append(color)
+        self.traces.set_color(colors)
+        if draw:
+            self.fig.canvas.draw_idle()
+
+    def _update(self, draw=True):
+        """ Rebuild the traces of the current window: O(channels x pixels), whatever the sampling rate. """
+        start = int(round(self.t_start * self.sfreq))
+        stop = min(self.pyramid.n_times, start + int(round(self.duration * self.sfreq)) + 1)
+        x, values = self.pyramid.window(start, stop, int(self.ax.bbox.width))
+        values = np.clip(values * (self._scale * self.amplitude), -CLIPPING, CLIPPING)
+        segments = np.empty(values.shape + (2,))
+        segments[..., 0] = x / self.sfreq
+        segments[..., 1] = self._offsets - values  # y axis points down
+        self.traces.set_segments(segments)
+        self.ax.set_xlim(self.t_start, self.t_start + self.duration)
+        self.scroll_box.set_x(self.t_start)
+        if draw:
+            self._blit()
+
+    def _on_draw(self, event):
+        """ After a full draw: cache the static part of the figure, then add the animated artists. """
+        self._background = self.fig.canvas.copy_from_bbox(self.fig.bbox)
+        for artist in self._animated:
+            self.fig.draw_artist(artist)
+
+    def _blit(self):
+        if self._background is None:
+            self.fig.canvas.draw_idle()
+            return
+        self.fig.canvas.restore_region(self._background)
+        for artist in self._animated:
+            self.fig.draw_artist(artist)
+        self.fig.canvas.blit(self.fig.bbox)
+
+    def _on_key(self, event):
+        steps = {'left': -0.25, 'right': 0.25, 'shift+left': -1., 'shift+right': 1.}
+        if event.key in steps:
+            self.scroll_to(self.t_start + steps[event.key] * self.duration)
+        elif event.key == 'home':
+            self.scroll_to(0.)
+        elif event.key == 'end':
+            self.scroll_to(self.total_duration)
+        elif event.key in ('+', '=', '-'):
+            self.amplitude *= 1.25 if event.key != '-' else 0.8
+            self._update()
+
+    def _on_scroll(self, event):
+        self.scroll_to(self.t_start + (0.25 if event.button == 'down' else -0.25) * self.duration)
+
+    def _on_click(self, event):
+        if event.inaxes is self.ax_scroll and event.xdata is not None:
+            self.scroll_to(event.xdata - self.duration / 2)
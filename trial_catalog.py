@@ -0,0 +1,219 @@
+# trial_catalog.py
+# SQLite index of all trials (MEEG trials and ICA files), one row per file.
+# preprocess_and_make_trials and fit_and_save_ica add rows as they write files;
+# the trainer queries it to build sessions instead of listing directories.
+# Metadata (subj/ses/run, version, bad-channel count, size, ...) is thus
+# filterable without opening any trial.
+# e.g. python trial_catalog.py   (rebuilds the catalog from data/trials and data/ica)
+import os
+import sqlite3
+import random
+import config
+
+_COLUMNS = (
+    "path", "root", "mode", "ch_type", "file", "subj", "ses", "run", "version",
+    "n_channels", "n_bad", "n_components", "duration_s", "file_size", "created",
+)
+FILTER_COLUMNS = ("subj", "ses", "run", "version", "n_channels", "n_bad", "n_components", "duration_s", "file_size")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS trials (
+    path TEXT PRIMARY KEY,
+    root TEXT NOT NULL,
+    mode TEXT NOT NULL,
+    ch_type TEXT NOT NULL,
+    file TEXT NOT NULL,
+    subj TEXT,
+    ses TEXT,
+    run TEXT,
+    version INTEGER,
+    n_channels INTEGER,
+    n_bad INTEGER,
+    n_components INTEGER,
+    duration_s REAL,
+    file_size INTEGER,
+    created REAL
+);
+CREATE INDEX IF NOT EXISTS trials_mode_type ON trials (mode, root, ch_type);
+CREATE INDEX IF NOT EXISTS trials_subject ON trials (subj, ses, run);
+"""
+
+
+def connect(catalog_path=config.trial_catalog):
+    """ Connection to the catalog, created if needed. Safe for several preprocessing workers. """
+    directory = os.path.dirname(catalog_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    conn = sqlite3.connect(catalog_path, timeout=60)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+def _split_name(file_name):
+    parts = file_name.split('_')
+    return tuple(parts[:3]) if len(parts) >= 3 else (None, None, None)
+
+
+def trial_row(header_path, root, header=None):
+    """ Catalog row of an MEEG trial from its header (trial_io format). """
+    from trial_io import read_trial_header, TRIAL_DATA_EXT
+    if header is None:
+        header = read_trial_header(header_path)
+    file_name = os.path.basename(header_path)
+    subj, ses, run = _split_name(file_name)
+    data_path = os.path.splitext(header_path)[0] + TRIAL_DATA_EXT
+    n_channels, n_times = header["shape"]
+    return {
+        "path": os.path.normpath(header_path),
+        "root": os.path.normpath(root),
+        "mode": "MEEG",
+        "ch_type": header["channel_type"],
+        "file": file_name,
+        "subj": header.get("subj", subj),
+        "ses": header.get("ses", ses),
+        "run": header.get("run", run),
+        "version": header.get("version"),
+        "n_channels": n_channels,
+        "n_bad": len(header["bad_chans_in_display"]),
+        "n_components": None,
+        "duration_s": n_times / header["sfreq"],
+        "file_size": os.path.getsize(header_path) + os.path.getsize(data_path),
+        "created": os.path.getmtime(header_path),
+    }
+
+
+def ica_row(ica_path, root, ch_type, n_components):
+    """ Catalog row of an ICA file (<root>/<ch_type>/subj_ses_run_<ch_type>_ica.fif). """
+    file_name = os.path.basename(ica_path)
+    subj, ses, run = _split_name(file_name)
+    return {
+        "path": os.path.normpath(ica_path),
+        "root": os.path.normpath(root),
+        "mode": "ICA",
+        "ch_type": ch_type,
+        "file": file_name,
+        "subj": subj,
+        "ses": ses,
+        "run": run,
+        "version": None,
+        "n_channels": None,
+        "n_bad": None,
+        "n_components": n_components,
+        "duration_s": None,
+        "file_size": os.path.getsize(ica_path),
+        "created": os.path.getmtime(ica_path),
+    }
+
+
+def add_rows(rows, catalog_path=config.trial_catalog):
+    """ Insert or replace rows (keyed by path) in one transaction. """
+    if not rows:
+        return
+    sql = f"INSERT OR REPLACE INTO trials ({', '.join(_COLUMNS)}) VALUES ({', '.join('?' * len(_COLUMNS))})"
+    conn = connect(catalog_path)
+    try:
+        with conn:
+            conn.executemany(sql, [tuple(row[c] for c in _COLUMNS) for row in rows])
+    finally:
+        conn.close()
+
+
+def query(mode, root, channel_types, filters=None, catalog_path=config.trial_catalog):
+    """
+    Rows (dicts) of `mode` under `root` for the given channel types.
+    `filters` maps a column of FILTER_COLUMNS to a value, a list of values, or a
+    (min, max) tuple (either bound may be None).
+    Rows whose file no longer exists are removed from the catalog, not returned.
+    """
+    if not os.path.exists(catalog_path):
+        return []
+    where = ["mode = ?", "root = ?", f"ch_type IN ({', '.join('?' * len(channel_types))})"]
+    params = [mode, os.path.normpath(root), *channel_types]
+    for column, value in (filters or {}).items():
+        if column not in FILTER_COLUMNS:
+            raise ValueError(f"Cannot filter the trial catalog on '{column}'")
+        if isinstance(value, tuple):
+            low, high = value
+            if low is not None:
+                where.append(f"{column} >= ?")
+                params.append(low)
+            if high is not None:
+                where.append(f"{column} <= ?")
+                params.append(high)
+        elif isinstance(value, list):
+            where.append(f"{column} IN ({', '.join('?' * len(value))})")
+            params.extend(value)
+        else:
+            where.append(f"{column} = ?")
+            params.append(value)
+    conn = connect(catalog_path)
+    try:
+        rows = [dict(row) for row in conn.execute(f"SELECT * FROM trials WHERE {' AND '.join(where)} ORDER BY path", params)]
+        # Files deleted or moved since they were indexed: drop their rows
+        stale = [row["path"] for row in rows if not os.path.exists(row["path"])]
+        if stale:
+            with conn:
+                conn.executemany("DELETE FROM trials WHERE path = ?", [(path,) for path in stale])
+            print(f"[CATALOG] Removed {len(stale)} entries of missing files")
+    finally:
+        conn.close()
+    stale = set(stale)
+    return [row for row in rows if row["path"] not in stale]
+
+
+def stratified_sample(rows, n, strata=("ch_type", "subj"), rng=random):
+    """
+    `n` rows spread evenly over the groups of `strata`: groups are shuffled, and
+    rows are drawn round-robin from them, so every channel type / subject appears
+    before any repeats.
+    """
+    groups = {}
+    for row in rows:
+        groups.setdefault(tuple(row.get(key) for key in strata), []).append(row)
+    pools = list(groups.values())
+    rng.shuffle(pools)
+    for pool in pools:
+        rng.shuffle(pool)
+
+    chosen = []
+    while len(chosen) < min(n, len(rows)):
+        for pool in pools:
+            if pool and len(chosen) < n:
+                chosen.append(pool.pop())
+    return chosen
+
+
+def rebuild(trials_dir=config.trials_dir, ica_dir=config.ica_dir, catalog_path=config.trial_catalog):
+    """ Re-index every trial header and ICA file on disk, dropping rows of deleted files. """
+    from trial_io import TRIAL_HEADER_EXT
+    rows = []
+    for root, mode in ((trials_dir, "MEEG"), (ica_dir, "ICA")):
+        if not os.path.isdir(root):
+            continue
+        for ch_type in sorted(os.listdir(root)):
+            ch_dir = os.path.join(root, ch_type)
+            if not os.path.isdir(ch_dir):
+                continue
+            for file_name in sorted(os.listdir(ch_dir)):
+                path = os.path.join(ch_dir, file_name)
+                if mode == "MEEG" and file_name.endswith(TRIAL_HEADER_EXT):
+                    rows.append(trial_row(path, root))
+                elif mode == "ICA" and file_name.endswith('_ica.fif'):
+                    import mne
+                    ica = mne.preprocessing.read_ica(path, verbose=False)
+                    rows.append(ica_row(path, root, ch_type, ica.n_components_))
+
+    conn = connect(catalog_path)
+    try:
+        with conn:
+            conn.execute("DELETE FROM trials")
+    finally:
+        conn.close()
+    add_rows(rows, catalog_path)
+    return len(rows)
+
+
+if __name__ == "__main__":
+    print(f"[CATALOG] {rebuild()} files indexed in {config.trial_catalog}")
@@ -0,0 +1,121 @@
+# trial_io.py
+# Compact on-disk format for MEEG trials.
+# A trial is two files sharing a basename:
+#   <name>.json : small header (channel names/types, sfreq, bads, answer, ...)
+#   <name>.npy  : float32 array (n_channels, n_times), readable with np.load(mmap_mode='r')
+# Older trials were pickled mne.io.Raw copies (.pkl); load_trial still reads those.
+import os
+import json
+import pickle
+import numpy as np
+import mne
+
+TRIAL_FORMAT_VERSION = 1
+TRIAL_HEADER_EXT = '.json'
+TRIAL_DATA_EXT = '.npy'
+_COPY_CHUNK = 1 << 20  # samples per channel copied at a time from a `source` array
+
+
+def save_trial(raw, trial_path, chs_to_display, bad_chans_in_display, channel_type, start=0, stop=None, meta=None, source=None):
+    """
+    Write the picked channels of `raw` as a trial.
+
+    Args:
+        raw (mne.io.Raw): Preprocessed (preloaded) recording.
+        trial_path (str): Output path without extension.
+        chs_to_display (list): Channel names or indices into raw.ch_names, in display order.
+        bad_chans_in_display (list): The answer for this trial.
+        channel_type (str): 'eeg', 'mag' or 'grad'.
+        start, stop (int): Sample window kept for the trial (default: whole recording).
+        meta (dict): Optional extra header fields (subj, ses, run, version, ...).
+        source (array-like): Samples of all channels of `raw` (e.g. the memory-mapped
+            output of streaming mode). If given, the trial is copied from it in
+            chunks instead of from `raw`, so memory stays bounded.
+
+    Returns:
+        str: Path of the header file.
+    """
+    rows = [raw.ch_names.index(ch) if isinstance(ch, str) else int(ch) for ch in chs_to_display]
+    ch_names = [raw.ch_names[i] for i in rows]
+
+    data_path = trial_path + TRIAL_DATA_EXT
+    if source is None:
+        # get_data on the picks avoids copying the whole recording like raw.copy().pick()
+        data = raw.get_data(picks=rows, start=start, stop=stop).astype(np.float32, copy=False)
+        np.save(data_path, data)
+    else:
+        stop = source.shape[1] if stop is None else stop
+        data = np.lib.format.open_memmap(
+            data_path, mode='w+', dtype=np.float32, shape=(len(rows), int(stop - start))
+        )
+        for c0 in range(start, stop, _COPY_CHUNK):
+            c1 = min(c0 + _COPY_CHUNK, stop)
+            data[:, c0 - start:c1 - start] = source[rows, c0:c1]
+        data.flush()
+
+    header = {
+        "format_version": TRIAL_FORMAT_VERSION,
+        "data_file": os.path.basename(data_path),
+        "shape": list(data.shape),
+        "dtype": str(data.dtype),
+        "ch_names": ch_names,
+        "ch_types": raw.get_channel_types(picks=rows),
+        "sfreq": float(raw.info['sfreq']),
+        "highpass": float(raw.info['highpass']),
+        "lowpass": float(raw.info['lowpass']),
+        "tmin": start / raw.info['sfreq'],
+        "bads": [ch for ch in raw.info['bads'] if ch in ch_names],
+        "bad_chans_in_display": list(bad_chans_in_display),
+        "channel_type": channel_type,
+    }
+    if meta:
+        header.update(meta)
+
+    # Header is written last, so an existing header means a complete trial
+    header_path = trial_path + TRIAL_HEADER_EXT
+    with open(header_path, 'w') as f:
+        json.dump(header, f)
+    return header_path
+
+
+def read_trial_header(header_path):
+    with open(header_path, 'r') as f:
+        return json.load(f)
+
+
+def load_trial_array(header_path, header=None, mmap=True):
+    """ The trial samples as a (n_channels, n_times) float32 array, memory-mapped by default. """
+    if header is None:
+        header = read_trial_header(header_path)
+    data_path = os.path.join(os.path.dirname(header_path), header["data_file"])
+    return np.load(data_path, mmap_mode='r' if mmap else None)
+
+
+def header_to_info(header):
+    """ Rebuild the minimal mne.Info needed to browse a trial. """
+    info = mne.create_info(header["ch_names"], header["sfreq"], header["ch_types"])
+    with info._unlock():
+        info['highpass'] = header.get("highpass", 0.)
+        info['lowpass'] = header.get("lowpass", header["sfreq"] / 2.)
+    info['bads'] = list(header.get("bads", []))
+    return info
+
+
+def load_trial(trial_path):
+    """
+    Load a trial as the dict the trainer expects:
+    {"data": mne.io.RawArray, "bad_chans_in_display": [...], "channel_type": str}
+    Legacy .pkl trials are unpickled as before.
+    """
+    if trial_path.endswith('.pkl'):
+        with open(trial_path, 'rb') as f:
+            return pickle.load(f)
+
+    header = read_trial_header(trial_path)
+    data = load_trial_array(trial_path, header=header)
+    raw = mne.io.RawArray(data, header_to_info(header), verbose=False)
+    return {
+        "data": raw,
+        "bad_chans_in_display": header["bad_chans_in_display"],
+        "channel_type": header.get("channel_type", "Unknown"),
+    }